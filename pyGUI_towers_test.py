@@ -23,6 +23,7 @@ from ui.extract import extract_and_visualize_towers  # 导入extract.py
 
 from utils.table_match_gim import match_from_gim_tower_list
 from utils.table_match_gim import correct_from_gim_tower_list
+from utils.table_match_gim import table_row_texts
 from utils.tower_extraction import extract_towers
 
 
@@ -629,27 +630,27 @@ class TowerDetectionTool(QMainWindow):
             if left_layout and left_layout.layout():
                 for i in range(left_layout.layout().count()):
                     item = left_layout.layout().itemAt(i)
-                    if item and hasattr(item.widget(), 'rowCount'):  # 是表格
+                    if item and hasattr(item.widget(), 'model'):  # 是表格（QTableView / QTableWidget）
                         table = item.widget()
 
                         # 提取表格数据 - 适配新的列名和位置调换
                         # 新的列顺序：["杆塔编号", "纬度", "经度", "高程", "北方向偏角"]
-                        for row in range(table.rowCount()):
-                            if table.item(row, 0):  # 确保行有数据
-                                row_data = {
-                                    '杆塔编号': table.item(row, 0).text() if table.item(row, 0) else '',
-                                    '纬度': table.item(row, 1).text() if table.item(row, 1) else '0',
-                                    '经度': table.item(row, 2).text() if table.item(row, 2) else '0',
-                                    '高度': table.item(row, 3).text() if table.item(row, 3) else '0',  # 保持'高度'键名以兼容现有代码
-                                    '北方向偏角': table.item(row, 4).text() if table.item(row, 4) else '0'
-                                }
-
-                                # 添加CBM路径信息（如果原始数据中有）
-                                if row < len(self.tower_list):
-                                    original_tower = self.tower_list[row]
-                                    row_data['CBM路径'] = original_tower.get('cbm_path', '')
-
-                                corrected_data.append(row_data)
+                        # 经由表格模型读取，匹配/校对面板的表格是基于模型的QTableView
+                        for row, cells in enumerate(table_row_texts(table)):
+                            row_data = {
+                                '杆塔编号': cells[0],
+                                '纬度': cells[1] or '0',
+                                '经度': cells[2] or '0',
+                                '高度': cells[3] or '0',  # 保持'高度'键名以兼容现有代码
+                                '北方向偏角': cells[4] or '0'
+                            }
+
+                            # 添加CBM路径信息（如果原始数据中有）
+                            if row < len(self.tower_list):
+                                original_tower = self.tower_list[row]
+                                row_data['CBM路径'] = original_tower.get('cbm_path', '')
+
+                            corrected_data.append(row_data)
                         break
 
             return corrected_data
@@ -0,0 +1,56 @@
+# 批量高程转换测试：逐点标记是否由EGM2008转换，失败的点回退到区域经验N值
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("pyproj")
+
+from utils.elevation_converter import ElevationConverter
+
+
+class _GridTransformer:
+    """模拟格网转换：N 固定为 20 米，经度大于 113 度视为格网外（PROJ 返回 inf）"""
+
+    def transform(self, lons, lats, heights):
+        lons = np.asarray(lons)
+        ortho = np.where(lons > 113.0, np.inf, np.asarray(heights) - 20.0)
+        return lons, lats, ortho
+
+
+class _BrokenTransformer:
+    def transform(self, lons, lats, heights):
+        raise RuntimeError("grid unavailable")
+
+
+def _converter(transformer):
+    converter = ElevationConverter.__new__(ElevationConverter)
+    converter.region_n_value = 25.0
+    converter.area_of_interest = None
+    converter.transformer = transformer
+    return converter
+
+
+def test_convert_batch_marks_points_outside_grid():
+    ortho, applied = _converter(_GridTransformer()).convert_batch(
+        [28.2, 28.3], [112.9, 113.1], [100.0, 120.0], return_applied=True)
+
+    np.testing.assert_allclose(ortho, [80.0, 95.0])
+    assert applied.tolist() == [True, False]
+
+
+def test_convert_batch_without_transformer_uses_region_n():
+    ortho, applied = _converter(None).convert_batch([28.2], [112.9], [100.0], return_applied=True)
+
+    np.testing.assert_allclose(ortho, [75.0])
+    assert applied.tolist() == [False]
+
+
+def test_convert_batch_transform_error_falls_back():
+    converter = _converter(_BrokenTransformer())
+
+    np.testing.assert_allclose(converter.convert_batch([28.2], [112.9], [100.0]), [75.0])
+    assert converter.convert_batch([28.2], [112.9], [100.0], return_applied=True)[1].tolist() == [False]
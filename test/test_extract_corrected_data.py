@@ -0,0 +1,68 @@
+# 校对面板数据提取测试：左表为基于模型的QTableView，编辑后的值必须被提取出来
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+pytest.importorskip("PyQt5")
+pytest.importorskip("pyproj")
+pytest.importorskip("sklearn")
+
+from PyQt5.QtCore import Qt
+from PyQt5.QtWidgets import QApplication
+
+from utils.table_match_gim import correct_from_gim_tower_list, table_row_texts
+
+TOWER_LIST = [
+    {"lat": 28.230000, "lng": 112.940000, "h": 100.0, "r": 15.0,
+     "properties": {"杆塔编号": "N1"}, "cbm_path": "N1.cbm"},
+    {"lat": 28.231000, "lng": 112.941000, "h": 105.0, "r": 30.0,
+     "properties": {"杆塔编号": "N2"}, "cbm_path": "N2.cbm"},
+]
+
+
+@pytest.fixture(scope="module")
+def app():
+    return QApplication.instance() or QApplication([])
+
+
+def _left_table(panel):
+    left_layout = panel.layout().itemAt(0).layout()
+    for i in range(left_layout.count()):
+        widget = left_layout.itemAt(i).widget()
+        if hasattr(widget, "model"):
+            return widget
+    raise AssertionError("校对面板中未找到左侧表格")
+
+
+def test_table_row_texts_reads_model_backed_table(app):
+    panel = correct_from_gim_tower_list(TOWER_LIST, [])
+    rows = table_row_texts(_left_table(panel))
+
+    assert rows == [
+        ["N1", "28.230000", "112.940000", "100.00", "15.0"],
+        ["N2", "28.231000", "112.941000", "105.00", "30.0"],
+    ]
+
+
+def test_extract_corrected_data_keeps_edited_values(app):
+    # 主窗口模块依赖点云与三维显示库
+    for mod in ("laspy", "open3d", "vtk"):
+        pytest.importorskip(mod)
+    from pyGUI_towers_test import TowerDetectionTool
+
+    panel = correct_from_gim_tower_list(TOWER_LIST, [])
+    model = _left_table(panel).model()
+    assert model.setData(model.index(1, 3), "123.45", Qt.EditRole)
+
+    fake_window = SimpleNamespace(tower_list=TOWER_LIST, log_output=None)
+    data = TowerDetectionTool.extract_corrected_data_from_widget(fake_window, panel)
+
+    assert [row["杆塔编号"] for row in data] == ["N1", "N2"]
+    assert data[1]["高度"] == "123.45"
+    assert data[0]["纬度"] == "28.230000"
+    assert data[1]["CBM路径"] == "N2.cbm"
@@ -0,0 +1,109 @@
+# 杆塔匹配一致性测试：各匹配路径（numba内核、numpy等距粗筛、numpy纯haversine、BallTree）
+# 与逐对比较、首个匹配即跳出的标量实现结果一致
+import math
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("sklearn")
+pytest.importorskip("pyproj")
+pytest.importorskip("PyQt5")
+
+import utils.table_match_gim as utils_match
+import ui.ui.table_match_gim as ui_match
+
+DISTANCE_THRESHOLD = 50
+HEIGHT_THRESHOLD = 100
+SEEDS = range(25)
+# 点云杆塔数分别落在 BALLTREE_MIN_POINTS 两侧
+PC_COUNTS = [utils_match.BALLTREE_MIN_POINTS // 4, utils_match.BALLTREE_MIN_POINTS * 3]
+
+
+def _scalar_haversine(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = math.sin(dlat / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon / 2) ** 2
+    return 2 * 6371000.0 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
+def _reference_match(gim_lat, gim_lon, gim_h, pc_lat, pc_lon, pc_h):
+    """原始的逐对比较实现：每个GIM杆塔取第一个满足条件的点云杆塔"""
+    matched = []
+    for i in range(len(gim_lat)):
+        for j in range(len(pc_lat)):
+            distance = _scalar_haversine(gim_lat[i], gim_lon[i], pc_lat[j], pc_lon[j])
+            if distance <= DISTANCE_THRESHOLD and abs(gim_h[i] - pc_h[j]) <= HEIGHT_THRESHOLD:
+                matched.append((i, j))
+                break
+    return matched
+
+
+def _fixture(seed, n_pc):
+    """沿南北向长线路布置GIM杆塔，点云杆塔部分落在其附近（含多个候选），其余随机分布"""
+    rng = np.random.default_rng(seed)
+    n_gim = 40
+    gim_lat = np.sort(rng.uniform(27.5, 29.5, n_gim))
+    gim_lon = 112.9 + rng.uniform(-0.01, 0.01, n_gim)
+    gim_h = rng.uniform(50.0, 300.0, n_gim)
+
+    near = rng.integers(0, n_gim, n_pc)
+    offset_m = rng.uniform(0.0, 2 * DISTANCE_THRESHOLD, n_pc)
+    bearing = rng.uniform(0.0, 2 * np.pi, n_pc)
+    pc_lat = gim_lat[near] + np.degrees(offset_m * np.cos(bearing) / utils_match.EARTH_RADIUS)
+    pc_lon = gim_lon[near] + np.degrees(
+        offset_m * np.sin(bearing) / (utils_match.EARTH_RADIUS * np.cos(np.radians(gim_lat[near]))))
+    pc_h = gim_h[near] + rng.uniform(-2 * HEIGHT_THRESHOLD, 2 * HEIGHT_THRESHOLD, n_pc)
+
+    # 一部分点云杆塔散布在整条线路范围内，不靠近任何GIM杆塔
+    scatter = rng.random(n_pc) < 0.2
+    pc_lat[scatter] = rng.uniform(27.5, 29.5, scatter.sum())
+    pc_lon[scatter] = 112.9 + rng.uniform(-0.05, 0.05, scatter.sum())
+    return gim_lat, gim_lon, gim_h, pc_lat, pc_lon, pc_h
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+@pytest.mark.parametrize("n_pc", PC_COUNTS)
+@pytest.mark.parametrize("use_numba", [True, False])
+@pytest.mark.parametrize("use_equirect", [True, False])
+def test_utils_match_tower_arrays_matches_reference(monkeypatch, seed, n_pc, use_numba, use_equirect):
+    if use_numba and not utils_match.HAS_NUMBA:
+        pytest.skip("numba 不可用")
+    monkeypatch.setattr(utils_match, "HAS_NUMBA", use_numba)
+    arrays = _fixture(seed, n_pc)
+
+    result = utils_match.match_tower_arrays(*arrays, distance_threshold=DISTANCE_THRESHOLD,
+                                            height_threshold=HEIGHT_THRESHOLD, use_equirect=use_equirect)
+
+    assert result == _reference_match(*arrays)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+@pytest.mark.parametrize("n_pc", PC_COUNTS)
+def test_ui_match_tower_arrays_matches_reference(seed, n_pc):
+    arrays = _fixture(seed, n_pc)
+
+    result = ui_match.match_tower_arrays(*arrays, distance_threshold=DISTANCE_THRESHOLD,
+                                         height_threshold=HEIGHT_THRESHOLD)
+
+    assert result == _reference_match(*arrays)
+
+
+def test_fixtures_exercise_matches_and_misses():
+    """保证测试数据既有匹配也有未匹配的GIM杆塔，且存在多个候选的情况"""
+    for n_pc in PC_COUNTS:
+        arrays = _fixture(0, n_pc)
+        matched = _reference_match(*arrays)
+        assert 0 < len(matched) < len(arrays[0])
+
+
+def test_empty_inputs():
+    empty = np.empty(0)
+    one = np.array([28.2])
+    assert utils_match.match_tower_arrays(empty, empty, empty, one, one, one) == []
+    assert utils_match.match_tower_arrays(one, one, one, empty, empty, empty) == []
+    assert ui_match.match_tower_arrays(empty, empty, empty, one, one, one) == []
@@ -0,0 +1,44 @@
+# 复核面板匹配测试：Excel 中坐标为空或非数字的行不应导致整体匹配失败
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pd = pytest.importorskip("pandas")
+pytest.importorskip("scipy")
+pytest.importorskip("PyQt5")
+
+from ui.review_panel import match_and_highlight
+
+TOWER_LIST = [
+    {"lat": 28.230000, "lng": 112.940000, "h": 100.0},
+    {"lat": 28.231000, "lng": 112.941000, "h": 105.0},
+]
+
+
+def test_match_skips_nan_coordinates():
+    df = pd.DataFrame({
+        "纬度": [float("nan"), 28.230010, 28.231010],
+        "经度": [112.940000, 112.940010, 112.941010],
+        "高度": [100.0, 101.0, 104.0],
+    })
+
+    assert match_and_highlight(TOWER_LIST, df) == [(0, 1), (1, 2)]
+
+
+def test_match_skips_blank_cells():
+    df = pd.DataFrame({
+        "纬度": ["", "28.230010", "28.231010"],
+        "经度": ["112.940000", "", "112.941010"],
+        "高度": [100.0, 101.0, 104.0],
+    })
+
+    assert match_and_highlight(TOWER_LIST, df) == [(1, 2)]
+
+
+def test_match_without_any_valid_coordinates():
+    df = pd.DataFrame({"纬度": [None], "经度": [None], "高度": [100.0]})
+
+    assert match_and_highlight(TOWER_LIST, df) == []
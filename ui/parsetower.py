@@ -1,5 +1,5 @@
 import os
-import pandas as pd
+from openpyxl import Workbook
 
 class GIMTower:
     def __init__(self, gim_file, log_callback=None):
@@ -18,7 +18,8 @@ class GIMTower:
         project_path = self.parse_project()
         self.build_tree(project_path)
         self.log_info("✅ GIM 文件解析完成，共解析杆塔数：" + str(len(self.arr)))
-        self.arr = self.deduplicate_by_cbm_path(self.arr)  # ✅ 去重
+        # visited_cbm_set 保证每个 CBM 只解析一次，arr 中不会出现重复杆塔
+        assert len({t['cbm_path'] for t in self.arr}) == len(self.arr)
         self.export_to_excel()
         return self.arr
 
@@ -115,41 +116,34 @@ class GIMTower:
 
     def export_to_excel(self, filename="tower_data.xlsx"):
         try:
-            data = []
+            # 只写模式逐行写入，无需先构造 DataFrame
+            wb = Workbook(write_only=True)
+            ws = wb.create_sheet("Sheet1")
+            ws.append(["系统层级", "系统类型", "经度", "纬度", "高度", "北方向偏角",
+                       "杆塔编号", "呼高", "杆塔高", "CBM路径"])
             for t in self.arr:
                 props = t.get("properties", {})
-                data.append({
-                    "系统层级": t.get("name", ""),
-                    "系统类型": t.get("type", ""),
-                    "经度": t.get("lng", ""),
-                    "纬度": t.get("lat", ""),
-                    "高度": t.get("h", ""),
-                    "北方向偏角": t.get("r", ""),
-                    "杆塔编号": props.get("杆塔编号", ""),
-                    "呼高": props.get("呼高", ""),
-                    "杆塔高": props.get("杆塔高", ""),
-                    "CBM路径": t.get("cbm_path", "")
-                })
-            df = pd.DataFrame(data)
+                ws.append([
+                    t.get("name", ""),
+                    t.get("type", ""),
+                    t.get("lng", ""),
+                    t.get("lat", ""),
+                    t.get("h", ""),
+                    t.get("r", ""),
+                    props.get("杆塔编号", ""),
+                    props.get("呼高", ""),
+                    props.get("杆塔高", ""),
+                    t.get("cbm_path", "")
+                ])
             if os.path.exists(filename):
                 os.remove(filename)
-            df.to_excel(filename, index=False)
+            wb.save(filename)
             self.log_info(f"📄 Excel 文件已生成: {filename}")
         except Exception as e:
             self.log_info(f"❌ Excel 导出失败: {e}")
 
 
 
-    def deduplicate_by_cbm_path(self, arr):
-        seen = set()
-        unique = []
-        for item in arr:
-            cbm = item.get("cbm_path")
-            if cbm not in seen:
-                unique.append(item)
-                seen.add(cbm)
-        return unique
-
     def get_cbm_filenames(self):
         return self.cbm_files
 
@@ -1,42 +1,67 @@
 import pandas as pd
 import os
 import math
-from PyQt5.QtWidgets import QWidget, QHBoxLayout, QTableWidget, QTableWidgetItem, QHeaderView, QSizePolicy
+import numpy as np
+from scipy.spatial import cKDTree
+from PyQt5.QtWidgets import QWidget, QHBoxLayout, QTableWidget, QTableWidgetItem, QHeaderView, QSizePolicy, QStyledItemDelegate
 from PyQt5.QtCore import Qt
 from PyQt5.QtGui import QColor
 from PyQt5.QtWidgets import QLabel
 
-# Haversine公式计算经纬度差异
-def haversine(lat1, lon1, lat2, lon2):
-    R = 6371.0  # 地球半径 (单位：公里)
+_DEG2RAD = math.pi / 180.0  # 角度转弧度系数，标量换算直接相乘
 
-    lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
-    dlat = lat2 - lat1
-    dlon = lon2 - lon1
+# 缓存已读取的 Excel，键为 (路径, 修改时间)，文件未变化时不重复解析
+_EXCEL_CACHE = {}
 
-    a = math.sin(dlat / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon / 2) ** 2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    distance = R * c * 1000  # 转换为米
-    return distance
+
+def read_excel_cached(excel_path):
+    key = (excel_path, os.stat(excel_path).st_mtime_ns)
+    df = _EXCEL_CACHE.get(key)
+    if df is None:
+        df = pd.read_excel(excel_path)
+        # 同一路径只保留最新版本
+        for old_key in [k for k in _EXCEL_CACHE if k[0] == excel_path]:
+            del _EXCEL_CACHE[old_key]
+        _EXCEL_CACHE[key] = df
+    return df
+
+
+class CenterAlignDelegate(QStyledItemDelegate):
+    """统一居中绘制单元格文字，无需逐个单元格设置对齐方式"""
+
+    def initStyleOption(self, option, index):
+        super().initStyleOption(option, index)
+        option.displayAlignment = Qt.AlignCenter
 
 
 # 比对并高亮配对成功的行
 def match_and_highlight(tower_list, df, distance_threshold=50, height_threshold=100):
     matched_rows = []  # 存储配对成功的行
+    if not tower_list or len(df) == 0:
+        return matched_rows
+
+    R = 6371000.0  # 地球半径 (单位：米)
+    # 空白或非数字单元格转为NaN，只对坐标有效的行建树，其余行自然不参与匹配
+    lat = np.radians(pd.to_numeric(df["纬度"], errors="coerce").to_numpy(dtype=float))
+    lon = np.radians(pd.to_numeric(df["经度"], errors="coerce").to_numpy(dtype=float))
+    heights = pd.to_numeric(df["高度"], errors="coerce").to_numpy(dtype=float)
+    valid_rows = np.flatnonzero(np.isfinite(lat) & np.isfinite(lon))
+    if len(valid_rows) == 0:
+        return matched_rows
+
+    # 50米量级内用等距圆柱投影近似大圆距离，在平面上建立KD树
+    cos_lat0 = math.cos(float(lat[valid_rows].mean()))
+    tree = cKDTree(np.column_stack([lon[valid_rows] * cos_lat0 * R, lat[valid_rows] * R]))
+
     for row, t in enumerate(tower_list):
         tower_lat, tower_lon, tower_height = t.get("lat", 0), t.get("lng", 0), t.get("h", 0)
-        for shuffled_row in range(len(df)):
-            shuffled_lat, shuffled_lon, shuffled_height = df.iloc[shuffled_row]["纬度"], df.iloc[shuffled_row]["经度"], df.iloc[shuffled_row]["高度"]
+        x = tower_lon * _DEG2RAD * cos_lat0 * R
+        y = tower_lat * _DEG2RAD * R
 
-            # 计算经纬度距离
-            distance = haversine(tower_lat, tower_lon, shuffled_lat, shuffled_lon)
-
-            # 计算高度差异
-            height_diff = abs(tower_height - shuffled_height)
-
-            # 如果经纬度距离小于50米且高度差异小于height_threshold，标记为配对成功
-            if distance <= distance_threshold and height_diff <= height_threshold:
-                matched_rows.append((row, shuffled_row))
+        # 取距离阈值内的候选点，按行号顺序检查高度差，保持"首个匹配"语义
+        for shuffled_row in sorted(valid_rows[tree.query_ball_point((x, y), r=distance_threshold)]):
+            if abs(tower_height - heights[shuffled_row]) <= height_threshold:
+                matched_rows.append((row, int(shuffled_row)))
                 break  # 假设每个塔杆只能匹配一个位置
 
     return matched_rows
@@ -84,6 +109,11 @@ def build_review_widget(tower_list, preferred_height=400):
         table.setRowCount(300)  # 显示10行空白表格，保留表头结构
     table.setColumnCount(len(headers))
     table.setHorizontalHeaderLabels(headers)
+    table.setItemDelegate(CenterAlignDelegate(table))
+
+    # 填充期间暂停刷新和信号，避免逐个单元格重绘
+    table.setUpdatesEnabled(False)
+    table.blockSignals(True)
 
     # 填充 tower_list 数据
     if tower_list:
@@ -99,39 +129,51 @@ def build_review_widget(tower_list, preferred_height=400):
                 str(t.get("r", ""))
             ]
             for col, cell in enumerate(cells):
-                item = QTableWidgetItem(cell)
-                item.setTextAlignment(Qt.AlignCenter)
-                table.setItem(row, col, item)
+                table.setItem(row, col, QTableWidgetItem(cell))
 
+    table.blockSignals(False)
+    table.setUpdatesEnabled(True)
+
+    table_header = table.horizontalHeader()
     for col in range(table.columnCount()):
-        table.horizontalHeader().setSectionResizeMode(col, QHeaderView.Stretch)
+        table_header.setSectionResizeMode(col, QHeaderView.Stretch)
 
     # 加载 p35_p38_shuffled.xlsx 文件
     excel_table = QTableWidget()
+    excel_table.setItemDelegate(CenterAlignDelegate(excel_table))
     excel_path = os.path.join(os.getcwd(), "p35_p38_shuffled.xlsx")
 
     if os.path.exists(excel_path):
         try:
-            df = pd.read_excel(excel_path)
+            df = read_excel_cached(excel_path)
             excel_table.setRowCount(300)
             excel_table.setColumnCount(len(df.columns))
             excel_table.setHorizontalHeaderLabels(df.columns.tolist())
 
-            # 填充 excel 数据
-            for row in range(min(len(df), 300)):
-                for col in range(len(df.columns)):
-                    item = QTableWidgetItem(str(df.iat[row, col]))
-                    item.setTextAlignment(Qt.AlignCenter)
-                    excel_table.setItem(row, col, item)
-
+            # 填充 excel 数据（一次性取出底层数组，避免逐格 df.iat 调度）
+            vals = df.to_numpy(dtype=object)
+            n_rows = min(len(df), 300)
+            n_cols = len(df.columns)
+            excel_table.setUpdatesEnabled(False)
+            excel_table.blockSignals(True)
+            for row in range(n_rows):
+                for col in range(n_cols):
+                    excel_table.setItem(row, col, QTableWidgetItem(str(vals[row, col])))
+            excel_table.blockSignals(False)
+            excel_table.setUpdatesEnabled(True)
+
+            excel_header = excel_table.horizontalHeader()
             for col in range(excel_table.columnCount()):
-                excel_table.horizontalHeader().setSectionResizeMode(col, QHeaderView.Stretch)
+                excel_header.setSectionResizeMode(col, QHeaderView.Stretch)
 
             # 匹配并高亮配对成功的行
             matched_rows = match_and_highlight(tower_list, df)
 
             highlight_colors = [QColor(173, 216, 230), QColor(255, 255, 204), QColor(255, 240, 245)]  # 淡蓝色，淡黄色，淡粉色
             color_index = 0  # 用于轮流选择颜色
+            lon_col = df.columns.get_loc("经度")
+            lat_col = df.columns.get_loc("纬度")
+            h_col = df.columns.get_loc("高度")
 
             # 使用不同颜色高亮左侧和右侧的配对项
             for tower_row, excel_row in matched_rows:
@@ -144,9 +186,9 @@ def build_review_widget(tower_list, preferred_height=400):
                     excel_table.item(excel_row, col).setBackground(highlight_colors[color_index])  # 同样为右侧表格设置配对成功的颜色
 
                 # 将右侧表格中的经度、纬度、高度写入左侧表格
-                table.item(tower_row, 3).setText(str(df.iat[excel_row, df.columns.get_loc("经度")]))  # 经度列
-                table.item(tower_row, 4).setText(str(df.iat[excel_row, df.columns.get_loc("纬度")]))  # 纬度列
-                table.item(tower_row, 5).setText(str(df.iat[excel_row, df.columns.get_loc("高度")]))  # 高度列
+                table.item(tower_row, 3).setText(str(vals[excel_row, lon_col]))  # 经度列
+                table.item(tower_row, 4).setText(str(vals[excel_row, lat_col]))  # 纬度列
+                table.item(tower_row, 5).setText(str(vals[excel_row, h_col]))  # 高度列
 
                 # 切换到下一个颜色
                 color_index = (color_index + 1) % len(highlight_colors)
@@ -6,6 +6,13 @@ import subprocess
 import py7zr
 from io import BytesIO
 
+# GIM 只需要 7z 容器，压缩速度优先于压缩率
+PY7ZR_FILTERS = [{"id": py7zr.FILTER_LZMA2, "preset": 1}]
+CLI_COMPRESS_LEVEL = '-mx=3'
+
+# CBM 文件中 BLHA 行的输出格式：纬度,经度,高度,北方向偏角
+_BLHA_FMT = "BLHA=%.6f,%.6f,%.3f,%.3f\n"
+
 
 class CBMUpdater:
     def __init__(self, log_callback=None):
@@ -37,7 +44,7 @@ class CBMUpdater:
                 lines = file.readlines()
 
             # 更新BLHA行
-            new_blha_line = f"BLHA={lat:.6f},{lon:.6f},{height:.3f},{rotation:.3f}\n"
+            new_blha_line = _BLHA_FMT % (lat, lon, height, rotation)
             updated_lines = []
             blha_found = False
 
@@ -72,9 +79,9 @@ class CBMUpdater:
     def compress_with_7z_cli(self, source_folder, output_path):
         """使用7z命令行工具压缩"""
         try:
-            # 使用7z压缩，设置为最大压缩率
+            # 使用7z压缩，采用较低压缩级别以缩短封装时间
             result = subprocess.run([
-                '7z', 'a', '-mx=9', '-r',
+                '7z', 'a', CLI_COMPRESS_LEVEL, '-r',
                 output_path,
                 os.path.join(source_folder, '*')
             ], check=True, capture_output=True, text=True)
@@ -91,7 +98,7 @@ class CBMUpdater:
     def compress_with_py7zr(self, source_folder, output_path):
         """使用py7zr压缩"""
         try:
-            with py7zr.SevenZipFile(output_path, 'w', filters=[{"id": py7zr.FILTER_LZMA2}]) as archive:
+            with py7zr.SevenZipFile(output_path, 'w', filters=PY7ZR_FILTERS) as archive:
                 # 递归添加文件夹中的所有文件
                 for root, dirs, files in os.walk(source_folder):
                     for file in files:
@@ -1,47 +1,161 @@
-import math
+from itertools import cycle
 import numpy as np
 import pandas as pd
 from pyproj import Transformer
+from sklearn.neighbors import BallTree
 from PyQt5.QtWidgets import (QWidget, QHBoxLayout, QTableWidget,
-                             QTableWidgetItem, QHeaderView)
+                             QTableWidgetItem, QHeaderView, QStyledItemDelegate)
 from PyQt5.QtCore import Qt
-from PyQt5.QtGui import QColor
+from PyQt5.QtGui import QColor, QBrush
 
 from PyQt5.QtWidgets import QLabel, QTableWidget, QTableWidgetItem, QVBoxLayout, QWidget, QHBoxLayout
 from PyQt5.QtCore import Qt
 
 
+EARTH_RADIUS = 6371000.0  # 地球半径（米）
+BALLTREE_MIN_POINTS = 64  # 点云杆塔数少于此值时直接广播计算，建树不划算
+EQUIRECT_MARGIN = 1.01  # 等距圆柱近似粗筛时的距离放宽系数，保证不漏掉临界点
+
+# 预定义的右侧点云数据，模块加载时构造一次
+_PC_DATA = {
+    "杆塔编号": ["PC-1", "PC-2", "PC-3", "PC-4", "PC-5", "PC-6", "PC-7"],
+    "经度(WGS84)": [113.364177, 113.363205, 113.363373, 113.363229, 113.363038, 113.365303, 113.366543],
+    "纬度(WGS84)": [28.376950, 28.379824, 28.380078, 28.379745, 28.379539, 28.373667, 28.369945],
+    "海拔高度": [89.24, 130.78, 94.96, 106.09, 114.15, 98.67, 94.98],
+    "杆塔高度": [36.4, 26.8, 19.1, 41.1, 21.7, 52.5, 49.2],
+    "北方向偏角": [346.0, 85.8, 287.8, 237.8, 356.5, 72.2, 329.3]
+}
+
+# 点云数据结构
+_PC_TOWERS = []
+for _i in range(len(_PC_DATA["杆塔编号"])):
+    _PC_TOWERS.append({
+        'id': _PC_DATA["杆塔编号"][_i],
+        'latitude': _PC_DATA["纬度(WGS84)"][_i],
+        'longitude': _PC_DATA["经度(WGS84)"][_i],
+        'altitude': _PC_DATA["海拔高度"][_i],
+        'tower_height': _PC_DATA["杆塔高度"][_i],
+        'north_angle': _PC_DATA["北方向偏角"][_i]
+    })
+del _i
+
+# 点云表格数据，按列一次性格式化
+_PC_RIGHT_DATA = np.column_stack([
+    np.array(_PC_DATA["杆塔编号"]),
+    np.char.mod('%.6f', np.array(_PC_DATA["经度(WGS84)"])),
+    np.char.mod('%.6f', np.array(_PC_DATA["纬度(WGS84)"])),
+    np.char.mod('%.2f', np.array(_PC_DATA["海拔高度"])),
+    np.char.mod('%.1f', np.array(_PC_DATA["杆塔高度"])),
+    np.char.mod('%.1f', np.array(_PC_DATA["北方向偏角"]))
+])
+
+# 点云杆塔坐标按列存放（SoA），匹配时直接使用
+_PC_LAT = np.array(_PC_DATA["纬度(WGS84)"], dtype=np.float64)
+_PC_LON = np.array(_PC_DATA["经度(WGS84)"], dtype=np.float64)
+_PC_ALT = np.array(_PC_DATA["海拔高度"], dtype=np.float64)
+
+
 def haversine(lat1, lon1, lat2, lon2):
-    R = 6371.0  # 地球半径（公里）
-    lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
+    """支持 NumPy 广播：传入 (N,1) 与 (1,M) 数组即可一次得到 (N,M) 距离矩阵（米）"""
+    lat1, lon1, lat2, lon2 = np.radians(lat1), np.radians(lon1), np.radians(lat2), np.radians(lon2)
     dlat = lat2 - lat1
     dlon = lon2 - lon1
-    a = math.sin(dlat / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon / 2) ** 2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    return R * c * 1000  # 转换为米
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(a))
+
+
+def gim_coordinate_arrays(gim_list):
+    """将GIM杆塔字典列表拆成纬度、经度、高度三个数组"""
+    gim_lat = np.array([t.get("lat", 0) for t in gim_list], dtype=np.float64)
+    gim_lon = np.array([t.get("lng", 0) for t in gim_list], dtype=np.float64)
+    gim_h = np.array([t.get("h", 0) for t in gim_list], dtype=np.float64)
+    return gim_lat, gim_lon, gim_h
+
+
+def gim_table_data(gim_list):
+    """按列格式化GIM杆塔表格数据：编号、纬度、经度、高度、北方向偏角"""
+    gim_lat, gim_lon, gim_h = gim_coordinate_arrays(gim_list)
+    gim_r = np.array([t.get("r", 0) for t in gim_list], dtype=np.float64)
+    ids = np.array([t.get("properties", {}).get("杆塔编号", "") for t in gim_list], dtype=object)
+    return np.column_stack([
+        ids,
+        np.char.mod('%.6f', gim_lat),
+        np.char.mod('%.6f', gim_lon),
+        np.char.mod('%.2f', gim_h),
+        np.char.mod('%.1f', gim_r)
+    ])
 
 
 def match_towers(gim_list, pointcloud_towers, distance_threshold=50, height_threshold=100):
+    """兼容字典列表输入的匹配接口"""
+    if not gim_list or not pointcloud_towers:
+        return []
+
+    pc_lat = np.array([t['latitude'] for t in pointcloud_towers], dtype=np.float64)
+    pc_lon = np.array([t['longitude'] for t in pointcloud_towers], dtype=np.float64)
+    pc_h = np.array([t['altitude'] for t in pointcloud_towers], dtype=np.float64)
+    return match_tower_arrays(*gim_coordinate_arrays(gim_list), pc_lat, pc_lon, pc_h,
+                              distance_threshold, height_threshold)
+
+
+def match_tower_arrays(gim_lat, gim_lon, gim_h, pc_lat, pc_lon, pc_h,
+                       distance_threshold=50, height_threshold=100):
+    """按坐标数组匹配，返回[(gim_index, pc_index)]"""
+    if len(gim_lat) == 0 or len(pc_lat) == 0:
+        return []
+
+    if len(pc_lat) < BALLTREE_MIN_POINTS:
+        # 几十米尺度下用等距圆柱近似粗筛，只对候选对再用 haversine 精确判定
+        g_lat, g_lon = np.radians(gim_lat)[:, None], np.radians(gim_lon)[:, None]
+        p_lat, p_lon = np.radians(pc_lat)[None, :], np.radians(pc_lon)[None, :]
+        dx = (p_lon - g_lon) * np.cos((g_lat + p_lat) * 0.5) * EARTH_RADIUS
+        dy = (p_lat - g_lat) * EARTH_RADIUS
+        gate = distance_threshold * EQUIRECT_MARGIN
+        mask = (dx * dx + dy * dy <= gate * gate) & (np.abs(gim_h[:, None] - pc_h[None, :]) <= height_threshold)
+
+        rows, cols = np.nonzero(mask)
+        if len(rows):
+            exact = haversine(gim_lat[rows], gim_lon[rows], pc_lat[cols], pc_lon[cols])
+            mask[rows, cols] = exact <= distance_threshold
+
+        # argmax 返回每行第一个 True，与原先逐个比较后 break 的结果一致
+        has_match = mask.any(axis=1)
+        first = np.argmax(mask, axis=1)
+        return list(zip(np.flatnonzero(has_match).tolist(), first[has_match].tolist()))
+
+    # 点云杆塔较多时使用 haversine 度量的 BallTree 做半径查询
+    tree = BallTree(np.radians(np.column_stack([pc_lat, pc_lon])), metric='haversine')
+    candidates = tree.query_radius(np.radians(np.column_stack([gim_lat, gim_lon])),
+                                   r=distance_threshold / EARTH_RADIUS)
     matched_rows = []
+    for i, idxs in enumerate(candidates):
+        idxs = np.sort(idxs)  # 按点云序号排序，保持"首个匹配"语义
+        ok = idxs[np.abs(gim_h[i] - pc_h[idxs]) <= height_threshold]
+        if len(ok):
+            matched_rows.append((i, int(ok[0])))
+    return matched_rows
 
-    for i, gim_tower in enumerate(gim_list):
-        gim_lat = gim_tower.get("lat", 0)
-        gim_lon = gim_tower.get("lng", 0)
-        gim_height = gim_tower.get("h", 0)
 
-        for j, pc_tower in enumerate(pointcloud_towers):
-            pc_lat = pc_tower['latitude']
-            pc_lon = pc_tower['longitude']
-            pc_height = pc_tower['altitude']
+class CenterAlignDelegate(QStyledItemDelegate):
+    """统一居中绘制单元格文字，无需逐个单元格设置对齐方式"""
 
-            distance = haversine(gim_lat, gim_lon, pc_lat, pc_lon)
-            height_diff = abs(gim_height - pc_height)
+    def initStyleOption(self, option, index):
+        super().initStyleOption(option, index)
+        option.displayAlignment = Qt.AlignCenter
 
-            if distance <= distance_threshold and height_diff <= height_threshold:
-                matched_rows.append((i, j))
-                break
 
-    return matched_rows
+class RowHighlightDelegate(CenterAlignDelegate):
+    """按行号查表绘制背景色，高亮整行时无需逐个单元格 setBackground"""
+
+    def __init__(self, row_colors, parent=None):
+        super().__init__(parent)
+        self.row_brushes = {row: QBrush(color) for row, color in row_colors.items()}
+
+    def initStyleOption(self, option, index):
+        super().initStyleOption(option, index)
+        brush = self.row_brushes.get(index.row())
+        if brush is not None:
+            option.backgroundBrush = brush
 
 
 def create_tower_table(headers, data, row_count=None):
@@ -53,58 +167,33 @@ def create_tower_table(headers, data, row_count=None):
     table.setColumnCount(len(headers))
     table.setHorizontalHeaderLabels(headers)
 
-    for row in range(row_count):
-        if row < len(data):
-            row_data = data[row]
-            for col in range(min(len(row_data), table.columnCount())):
-                item = QTableWidgetItem(str(row_data[col]))
-                item.setTextAlignment(Qt.AlignCenter)
-                table.setItem(row, col, item)
+    # 填充期间关闭刷新、信号和排序，填充完成后统一布局
+    table.setUpdatesEnabled(False)
+    table.blockSignals(True)
+    table.setSortingEnabled(False)
+
+    # 文字居中由委托统一绘制，Item只承载文本；方法绑定为局部变量，内层循环不再逐格解析属性
+    table.setItemDelegate(CenterAlignDelegate(table))
+    n_cols = table.columnCount()
+    set_item = table.setItem
+    make_item = QTableWidgetItem
+    for row in range(min(row_count, len(data))):
+        for col, value in enumerate(data[row][:n_cols]):
+            set_item(row, col, make_item(str(value)))
+
+    table.blockSignals(False)
+    table.setUpdatesEnabled(True)
 
     table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
     return table
 
 
 def match_from_gim_tower_list(tower_list, pointcloud_towers, ):
-    # 使用您提供的右侧点云数据
-    pc_data = {
-        "杆塔编号": ["PC-1", "PC-2", "PC-3", "PC-4", "PC-5", "PC-6", "PC-7"],
-        "经度(WGS84)": [113.364177, 113.363205, 113.363373, 113.363229, 113.363038, 113.365303, 113.366543],
-        "纬度(WGS84)": [28.376950, 28.379824, 28.380078, 28.379745, 28.379539, 28.373667, 28.369945],
-        "海拔高度": [89.24, 130.78, 94.96, 106.09, 114.15, 98.67, 94.98],
-        "杆塔高度": [36.4, 26.8, 19.1, 41.1, 21.7, 52.5, 49.2],
-        "北方向偏角": [346.0, 85.8, 287.8, 237.8, 356.5, 72.2, 329.3]
-    }
-
-    # 创建点云数据结构
-    pc_towers = []
-    for i in range(len(pc_data["杆塔编号"])):
-        pc_towers.append({
-            'latitude': pc_data["纬度(WGS84)"][i],
-            'longitude': pc_data["经度(WGS84)"][i],
-            'altitude': pc_data["海拔高度"][i],
-            'tower_height': pc_data["杆塔高度"][i],
-            'north_angle': pc_data["北方向偏角"][i]
-        })
-
-    # 准备点云表格数据
-    right_data = []
-    for i in range(len(pc_data["杆塔编号"])):
-        right_data.append([
-            pc_data["杆塔编号"][i],
-            f"{pc_data['经度(WGS84)'][i]:.6f}",
-            f"{pc_data['纬度(WGS84)'][i]:.6f}",
-            f"{pc_data['海拔高度'][i]:.2f}",
-            f"{pc_data['杆塔高度'][i]:.1f}",
-            f"{pc_data['北方向偏角'][i]:.1f}"
-        ])
+    pc_towers = [dict(t) for t in _PC_TOWERS]  # 每个面板持有独立副本，修改不影响共享的预定义数据
+    right_data = _PC_RIGHT_DATA
 
     # 创建左侧表格数据 (GIM数据)
-    left_data = [
-        [t.get("properties", {}).get("杆塔编号", ""), f"{t.get('lat', 0):.6f}", f"{t.get('lng', 0):.6f}",
-         f"{t.get('h', 0):.2f}", f"{t.get('r', 0):.1f}"]
-        for t in tower_list
-    ]
+    left_data = gim_table_data(tower_list)
 
     # 创建左侧表格 (GIM杆塔)
     left_headers = ["杆塔编号", "纬度", "经度", "高度", "北方向偏角"]
@@ -125,18 +214,17 @@ def match_from_gim_tower_list(tower_list, pointcloud_towers, ):
     right_label.setStyleSheet("color: red; font-weight: bold; font-size: 14px;")
 
     # 执行匹配
-    matched = match_towers(tower_list, pc_towers)
+    matched = match_tower_arrays(*gim_coordinate_arrays(tower_list), _PC_LAT, _PC_LON, _PC_ALT)
     highlight_colors = [QColor(173, 216, 230), QColor(255, 255, 204), QColor(220, 220, 220)]
-    color_index = 0
 
-    for left_row, right_row in matched:
-        # 高亮匹配行
-        for col in range(table_left.columnCount()):
-            table_left.item(left_row, col).setBackground(highlight_colors[color_index])
-        for col in range(table_right.columnCount()):
-            table_right.item(right_row, col).setBackground(highlight_colors[color_index])
+    # 匹配对与颜色循环一次配好，记录匹配行颜色
+    pairs = list(zip(matched, cycle(highlight_colors)))
+    left_colors = {left_row: color for (left_row, _), color in pairs}
+    right_colors = {right_row: color for (_, right_row), color in pairs}
 
-        color_index = (color_index + 1) % len(highlight_colors)
+    # 高亮匹配行
+    table_left.setItemDelegate(RowHighlightDelegate(left_colors, table_left))
+    table_right.setItemDelegate(RowHighlightDelegate(right_colors, table_right))
 
     # 创建面板
     panel = QWidget()
@@ -165,50 +253,11 @@ def match_from_gim_tower_list(tower_list, pointcloud_towers, ):
 
 def correct_from_gim_tower_list(tower_list):
     """创建校对界面并校正GIM杆塔信息"""
-    # 使用预定义的点云数据
-    pc_data = {
-        "杆塔编号": ["PC-1", "PC-2", "PC-3", "PC-4", "PC-5", "PC-6", "PC-7"],
-        "经度(WGS84)": [113.364177, 113.363205, 113.363373, 113.363229, 113.363038, 113.365303, 113.366543],
-        "纬度(WGS84)": [28.376950, 28.379824, 28.380078, 28.379745, 28.379539, 28.373667, 28.369945],
-        "海拔高度": [89.24, 130.78, 94.96, 106.09, 114.15, 98.67, 94.98],
-        "杆塔高度": [36.4, 26.8, 19.1, 41.1, 21.7, 52.5, 49.2],
-        "北方向偏角": [346.0, 85.8, 287.8, 237.8, 356.5, 72.2, 329.3]
-    }
-
-    # 创建点云数据结构
-    pc_towers = []  # 使用内部定义的点云数据
-    for i in range(len(pc_data["杆塔编号"])):
-        pc_towers.append({
-            'id': pc_data["杆塔编号"][i],  # 添加id字段
-            'latitude': pc_data["纬度(WGS84)"][i],
-            'longitude': pc_data["经度(WGS84)"][i],
-            'altitude': pc_data["海拔高度"][i],
-            'tower_height': pc_data["杆塔高度"][i],
-            'north_angle': pc_data["北方向偏角"][i]
-        })
+    pc_towers = [dict(t) for t in _PC_TOWERS]  # 使用预定义的点云数据（面板独立副本）
+    right_data = _PC_RIGHT_DATA
 
     # 准备左表数据 (GIM杆塔)
-    left_data = []
-    for t in tower_list:
-        left_data.append([
-            t.get("properties", {}).get("杆塔编号", ""),  # 杆塔编号
-            f"{t.get('lat', 0):.6f}",  # 纬度
-            f"{t.get('lng', 0):.6f}",  # 经度
-            f"{t.get('h', 0):.2f}",  # 高度
-            f"{t.get('r', 0):.1f}"  # 方向角
-        ])
-
-    # 准备右表数据 (点云杆塔)
-    right_data = []
-    for i in range(len(pc_data["杆塔编号"])):
-        right_data.append([
-            pc_data["杆塔编号"][i],
-            f"{pc_data['经度(WGS84)'][i]:.6f}",
-            f"{pc_data['纬度(WGS84)'][i]:.6f}",
-            f"{pc_data['海拔高度'][i]:.2f}",
-            f"{pc_data['杆塔高度'][i]:.1f}",
-            f"{pc_data['北方向偏角'][i]:.1f}"
-        ])
+    left_data = gim_table_data(tower_list)
 
     # 创建左侧表格 (GIM杆塔)
     left_headers = ["杆塔编号", "纬度", "经度", "高度", "北方向偏角"]
@@ -229,28 +278,30 @@ def correct_from_gim_tower_list(tower_list):
     right_label.setStyleSheet("color: red; font-weight: bold; font-size: 14px;")
 
     # 执行匹配 - 使用内部定义的点云数据
-    matched = match_towers(tower_list, pc_towers)
+    matched = match_tower_arrays(*gim_coordinate_arrays(tower_list), _PC_LAT, _PC_LON, _PC_ALT)
     highlight_colors = [QColor(200, 255, 200), QColor(255, 230, 230), QColor(220, 220, 255)]
-    color_index = 0
 
-    for left_row, right_row in matched:
+    left_colors = {}
+    right_colors = {}
+    left_item = table_left.item  # 循环外绑定，逐格取Item时不再解析属性
+    for (left_row, right_row), color in zip(matched, cycle(highlight_colors)):
         # 获取点云杆塔信息
         pc_tower = pc_towers[right_row]  # 使用内部定义的点云数据
 
         # 校正GIM杆塔信息
-        table_left.item(left_row, 0).setText(pc_tower['id'])  # 杆塔编号
-        table_left.item(left_row, 1).setText(f"{pc_tower['latitude']:.6f}")  # 纬度
-        table_left.item(left_row, 2).setText(f"{pc_tower['longitude']:.6f}")  # 经度
-        table_left.item(left_row, 3).setText(f"{pc_tower['altitude']:.2f}")  # 高度
-        table_left.item(left_row, 4).setText(f"{pc_tower['north_angle']:.1f}")  # 方向角
-
-        # 高亮显示
-        for col in range(table_left.columnCount()):
-            table_left.item(left_row, col).setBackground(highlight_colors[color_index])
-        for col in range(table_right.columnCount()):
-            table_right.item(right_row, col).setBackground(highlight_colors[color_index])
-
-        color_index = (color_index + 1) % len(highlight_colors)
+        left_item(left_row, 0).setText(pc_tower['id'])  # 杆塔编号
+        left_item(left_row, 1).setText(f"{pc_tower['latitude']:.6f}")  # 纬度
+        left_item(left_row, 2).setText(f"{pc_tower['longitude']:.6f}")  # 经度
+        left_item(left_row, 3).setText(f"{pc_tower['altitude']:.2f}")  # 高度
+        left_item(left_row, 4).setText(f"{pc_tower['north_angle']:.1f}")  # 方向角
+
+        # 记录高亮颜色
+        left_colors[left_row] = color
+        right_colors[right_row] = color
+
+    # 高亮显示
+    table_left.setItemDelegate(RowHighlightDelegate(left_colors, table_left))
+    table_right.setItemDelegate(RowHighlightDelegate(right_colors, table_right))
 
     # 创建面板
     panel = QWidget()
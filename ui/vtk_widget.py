@@ -1,12 +1,45 @@
 # 修复后的vtk_widget.py
 
+import logging
 import vtk
 from PyQt5.QtWidgets import QWidget, QVBoxLayout
+from PyQt5.QtCore import QTimer
 from vtkmodules.qt.QVTKRenderWindowInteractor import QVTKRenderWindowInteractor
+from vtkmodules.util import numpy_support
 import numpy as np
 
+log = logging.getLogger(__name__)
+
+
+# 盒子8个顶点相对中心的符号（单位为半尺寸），顺序：底面0-3，顶面4-7
+_BOX_CORNER_SIGNS = np.array([
+    [-1, -1, -1], [1, -1, -1], [1, 1, -1], [-1, 1, -1],
+    [-1, -1, 1], [1, -1, 1], [1, 1, 1], [-1, 1, 1]
+], dtype=np.float32)
+
+# 盒子12条边
+_BOX_EDGES = np.array([
+    (0, 1), (1, 2), (2, 3), (3, 0),  # 底面
+    (4, 5), (5, 6), (6, 7), (7, 4),  # 顶面
+    (0, 4), (1, 5), (2, 6), (3, 7)  # 竖直边
+], dtype=np.int64)
+
+
+def _make_line_cells(edges):
+    """由 (n, 2) 的端点索引数组一次性构造线段单元"""
+    n_lines = len(edges)
+    conn = np.empty((n_lines, 3), dtype=np.int64)
+    conn[:, 0] = 2
+    conn[:, 1:] = edges
+    lines = vtk.vtkCellArray()
+    lines.SetCells(n_lines, numpy_support.numpy_to_vtkIdTypeArray(conn.ravel(), deep=True))
+    return lines
+
 
 class VTKPointCloudWidget(QWidget):
+    MAX_DISPLAY_POINTS = 500_000  # 点云显示上限，超过后按固定步长抽稀
+    PROGRESSIVE_MIN_POINTS = 200_000  # 仅加载点云（无杆塔）且点数超过此值时分块逐步显示
+
     def __init__(self, parent=None):
         super().__init__(parent)
         self.layout = QVBoxLayout(self)
@@ -22,6 +55,11 @@ class VTKPointCloudWidget(QWidget):
         self.renderer.SetBackground(0.1, 0.1, 0.1)  # 深灰色背景
 
         self.actors = []
+        self._point_actor = None  # 当前点云演员，重新显示时复用
+        self._tower_actors = {}  # id(geo) -> (geo, actor)，保留geo引用保证id不被复用
+        self._progressive_actors = []  # 分块逐步显示的点云演员
+        self._progressive_token = None  # 当前分块显示任务的标识，置空即取消未完成的分块
+        self._last_bounds_key = None  # 上次重置相机时的场景边界
 
         # 初始化VTK
         self.interactor.Initialize()
@@ -34,59 +72,93 @@ class VTKPointCloudWidget(QWidget):
                 if actor:
                     self.renderer.RemoveActor(actor)
             self.actors = []
+            self._point_actor = None
+            self._tower_actors = {}
+            self._progressive_actors = []
+            self._progressive_token = None
+            self._last_bounds_key = None
             self.vtk_widget.GetRenderWindow().Render()
         except Exception as e:
-            print(f"清空场景失败: {e}")
+            log.warning("清空场景失败: %s", e)
 
     def display_full_scene(self, full_pcd, tower_geometries):
         """显示完整场景：点云 + 杆塔"""
         try:
             point_count = len(np.asarray(full_pcd.points)) if full_pcd else 0
             tower_count = len(tower_geometries) if tower_geometries else 0
-            print(f"🎬 开始显示场景: 点云={point_count}, 杆塔={tower_count}")
+            log.info("🎬 开始显示场景: 点云=%d, 杆塔=%d", point_count, tower_count)
 
-            # 清空现有场景
-            self.clear_scene()
+            # 完整场景会替换分块显示的点云
+            self._cancel_progressive()
 
-            # 1. 显示点云
+            # 1. 显示点云：已有点云演员时只替换点数据，不重建管线
+            point_actor = None
             if full_pcd is not None:
                 points_np = np.asarray(full_pcd.points)
                 if len(points_np) > 0:
-                    print(f"📊 创建点云演员: {len(points_np)} 个点")
-                    point_actor = self.create_point_cloud_actor(points_np)
-                    if point_actor:
-                        self.renderer.AddActor(point_actor)
-                        self.actors.append(point_actor)
-                        print("✅ 点云演员添加成功")
+                    if not tower_geometries and len(points_np) > self.PROGRESSIVE_MIN_POINTS:
+                        # 加载点云时分块逐步显示，首块即覆盖完整范围，界面不被一次性上传阻塞
+                        self.display_point_cloud_progressive(points_np)
+                    elif self._point_actor is not None:
+                        log.debug("📊 更新点云演员: %d 个点", len(points_np))
+                        self.update_point_cloud_actor(self._point_actor, points_np)
+                        point_actor = self._point_actor
                     else:
-                        print("❌ 点云演员创建失败")
+                        log.debug("📊 创建点云演员: %d 个点", len(points_np))
+                        point_actor = self.create_point_cloud_actor(points_np)
+                        if point_actor:
+                            self.renderer.AddActor(point_actor)
+                            log.debug("✅ 点云演员添加成功")
+                        else:
+                            log.warning("❌ 点云演员创建失败")
                 else:
-                    print("⚠️ 点云为空")
+                    log.warning("⚠️ 点云为空")
             else:
-                print("⚠️ 未提供点云数据")
+                log.warning("⚠️ 未提供点云数据")
 
-            # 2. 显示杆塔几何体
+            if self._point_actor is not None and self._point_actor is not point_actor:
+                self.renderer.RemoveActor(self._point_actor)
+            self._point_actor = point_actor
+
+            # 2. 显示杆塔几何体：几何体对象未变的沿用原演员，只为新几何体创建演员
+            tower_actors = {}
             if tower_geometries and len(tower_geometries) > 0:
-                print(f"🏗️ 创建杆塔演员: {len(tower_geometries)} 个")
+                log.debug("🏗️ 创建杆塔演员: %d 个", len(tower_geometries))
                 success_count = 0
                 for i, geo in enumerate(tower_geometries):
+                    key = id(geo)
+                    if key in tower_actors:
+                        success_count += 1
+                        continue
+                    cached = self._tower_actors.pop(key, None)
+                    if cached is not None:
+                        tower_actors[key] = cached
+                        success_count += 1
+                        continue
                     try:
                         tower_actor = self.create_tower_actor(geo, i)
                         if tower_actor:
                             self.renderer.AddActor(tower_actor)
-                            self.actors.append(tower_actor)
+                            tower_actors[key] = (geo, tower_actor)
                             success_count += 1
                         else:
-                            print(f"⚠️ 杆塔 {i} 演员创建失败")
+                            log.warning("⚠️ 杆塔 %d 演员创建失败", i)
                     except Exception as e:
-                        print(f"❌ 杆塔 {i} 显示失败: {e}")
+                        log.warning("❌ 杆塔 %d 显示失败: %s", i, e)
 
-                print(f"✅ 成功添加 {success_count}/{len(tower_geometries)} 个杆塔演员")
+                log.info("✅ 成功添加 %d/%d 个杆塔演员", success_count, len(tower_geometries))
             else:
-                print("📭 无杆塔数据需要显示")
+                log.info("📭 无杆塔数据需要显示")
+
+            # 移除本次不再显示的杆塔演员
+            for _, stale_actor in self._tower_actors.values():
+                self.renderer.RemoveActor(stale_actor)
+            self._tower_actors = tower_actors
+
+            self.actors = ([point_actor] if point_actor else []) + [actor for _, actor in tower_actors.values()]
 
             # 3. 强制渲染更新
-            print("🖥️ 开始渲染场景...")
+            log.debug("🖥️ 开始渲染场景...")
             self.renderer.Modified()  # 标记渲染器已修改
 
             # 重置相机和渲染
@@ -95,12 +167,10 @@ class VTKPointCloudWidget(QWidget):
             # 确保窗口更新
             self.vtk_widget.update()
 
-            print(f"✅ 场景显示完成 - 总计 {len(self.actors)} 个演员")
+            log.info("✅ 场景显示完成 - 总计 %d 个演员", len(self.actors))
 
         except Exception as e:
-            print(f"❌ 显示场景失败: {e}")
-            import traceback
-            traceback.print_exc()
+            log.exception("❌ 显示场景失败: %s", e)
 
             # 即使失败也尝试基本渲染
             try:
@@ -108,47 +178,109 @@ class VTKPointCloudWidget(QWidget):
             except:
                 pass
 
+    def display_point_cloud_progressive(self, points_np, chunk=65536):
+        """
+        分块逐步显示点云
+
+        每块按步长从整个点云中取点，第一块即覆盖完整范围，其余块通过事件循环依次追加，
+        加载过程中界面保持可交互
+        """
+        self._cancel_progressive()
+        points_np = self._downsample_for_display(np.asarray(points_np))
+        if len(points_np) == 0:
+            return
+        n_chunks = (len(points_np) + chunk - 1) // chunk
+        token = object()
+        self._progressive_token = token
+        log.info("📊 分块显示点云: %d 个点, %d 块", len(points_np), n_chunks)
+
+        def add_chunk(k):
+            if self._progressive_token is not token:
+                return  # 已被新的显示任务或清空场景取消
+            actor = self.create_point_cloud_actor(points_np[k::n_chunks])
+            if actor:
+                self.renderer.AddActor(actor)
+                self.actors.append(actor)
+                self._progressive_actors.append(actor)
+            if k == 0:
+                self.reset_camera_and_render()
+            else:
+                self.vtk_widget.GetRenderWindow().Render()
+            if k + 1 < n_chunks:
+                QTimer.singleShot(0, lambda: add_chunk(k + 1))
+            else:
+                log.info("✅ 点云分块显示完成")
+
+        QTimer.singleShot(0, lambda: add_chunk(0))
+
+    def _cancel_progressive(self):
+        """取消未完成的分块显示并移除已添加的分块演员"""
+        self._progressive_token = None
+        for actor in self._progressive_actors:
+            self.renderer.RemoveActor(actor)
+            if actor in self.actors:
+                self.actors.remove(actor)
+        self._progressive_actors = []
+
     def create_point_cloud_actor(self, points_np):
         """创建点云演员"""
         try:
             # 如果点太多，进行下采样以提高性能
-            if len(points_np) > 500000:
-                print(f"点云过大({len(points_np)})，进行显示下采样...")
-                indices = np.random.choice(len(points_np), 500000, replace=False)
-                points_np = points_np[indices]
+            points_np = self._downsample_for_display(points_np)
 
-            # 创建VTK点
+            # 创建VTK点：连续float32数组直接交给VTK，不逐点复制；
+            # 始终拷贝一份，后续原地更新时不会改到调用方的数组
+            points_arr = np.array(points_np, dtype=np.float32, order='C')
             vtk_points = vtk.vtkPoints()
-            vtk_points.SetNumberOfPoints(len(points_np))
-
-            for i, point in enumerate(points_np):
-                vtk_points.SetPoint(i, point[0], point[1], point[2])
+            vtk_points.SetData(numpy_support.numpy_to_vtk(points_arr, deep=False, array_type=vtk.VTK_FLOAT))
 
-            # 创建多边形数据
+            # 创建多边形数据，只需点坐标，不需要顶点单元
             poly_data = vtk.vtkPolyData()
             poly_data.SetPoints(vtk_points)
 
-            # 创建顶点
-            vertex_filter = vtk.vtkVertexGlyphFilter()
-            vertex_filter.SetInputData(poly_data)
-            vertex_filter.Update()
-
-            # 创建映射器
-            mapper = vtk.vtkPolyDataMapper()
-            mapper.SetInputConnection(vertex_filter.GetOutputPort())
+            # 创建映射器：点云专用映射器直接遍历点，缩放系数为0时按点大小绘制实心点
+            mapper = vtk.vtkPointGaussianMapper()
+            mapper.SetInputData(poly_data)
+            mapper.SetScaleFactor(0.0)
+            mapper.EmissiveOff()
 
             # 创建演员
             actor = vtk.vtkActor()
             actor.SetMapper(mapper)
             actor.GetProperty().SetPointSize(1)  # 点大小
             actor.GetProperty().SetColor(0.8, 0.8, 0.8)  # 浅灰色点云
+            actor._np_ref = points_arr  # VTK直接引用该缓冲区，需与演员同生命周期
+            actor._vtk_points = vtk_points
+            actor._poly_data = poly_data
 
             return actor
 
         except Exception as e:
-            print(f"创建点云演员失败: {e}")
+            log.warning("创建点云演员失败: %s", e)
             return None
 
+    def update_point_cloud_actor(self, actor, points_np):
+        """复用点云演员，只替换点数据；点数不变时直接写入原缓冲区"""
+        points_np = self._downsample_for_display(points_np)
+        if len(points_np) == len(actor._np_ref):
+            actor._np_ref[:] = points_np
+            actor._vtk_points.Modified()
+        else:
+            points_arr = np.array(points_np, dtype=np.float32, order='C')
+            actor._vtk_points.SetData(numpy_support.numpy_to_vtk(points_arr, deep=False, array_type=vtk.VTK_FLOAT))
+            actor._np_ref = points_arr
+        actor._poly_data.Modified()
+
+    def _downsample_for_display(self, points_np):
+        """超过显示上限时按固定步长抽稀"""
+        max_points = self.MAX_DISPLAY_POINTS
+        if len(points_np) > max_points:
+            log.info("点云过大(%d)，进行显示下采样...", len(points_np))
+            # 固定步长切片得到视图，不生成全量随机排列，且保持点的空间连续性
+            step = (len(points_np) + max_points - 1) // max_points
+            points_np = points_np[::step]
+        return points_np
+
     def create_tower_actor(self, geo, index):
         """创建杆塔演员"""
         try:
@@ -166,11 +298,11 @@ class VTKPointCloudWidget(QWidget):
                     return self.create_box_actor(center, size, (1, 0, 0), index)
 
             else:
-                print(f"未知的杆塔几何体格式: {type(geo)}")
+                log.warning("未知的杆塔几何体格式: %s", type(geo))
                 return None
 
         except Exception as e:
-            print(f"创建杆塔演员失败 (索引{index}): {e}")
+            log.warning("创建杆塔演员失败 (索引%d): %s", index, e)
             return None
 
     def create_line_actor(self, pts_np, color, index):
@@ -180,23 +312,17 @@ class VTKPointCloudWidget(QWidget):
                 return None
 
             # 创建VTK点
+            points_arr = np.ascontiguousarray(pts_np, dtype=np.float32)
             vtk_points = vtk.vtkPoints()
-            for pt in pts_np:
-                vtk_points.InsertNextPoint(pt[0], pt[1], pt[2])
+            vtk_points.SetData(numpy_support.numpy_to_vtk(points_arr, deep=False, array_type=vtk.VTK_FLOAT))
 
             # 创建多边形数据
             poly_data = vtk.vtkPolyData()
             poly_data.SetPoints(vtk_points)
 
-            # 创建线段
-            lines = vtk.vtkCellArray()
-            # 每两个点构成一条线
-            for i in range(0, len(pts_np) - 1, 2):
-                if i + 1 < len(pts_np):
-                    line = vtk.vtkLine()
-                    line.GetPointIds().SetId(0, i)
-                    line.GetPointIds().SetId(1, i + 1)
-                    lines.InsertNextCell(line)
+            # 创建线段：每两个点构成一条线
+            n_lines = len(points_arr) // 2
+            lines = _make_line_cells(np.arange(n_lines * 2, dtype=np.int64).reshape(n_lines, 2))
 
             poly_data.SetLines(lines)
 
@@ -218,49 +344,26 @@ class VTKPointCloudWidget(QWidget):
 
             actor.GetProperty().SetLineWidth(3)  # 线条宽度
             actor.GetProperty().SetLighting(False)  # 关闭光照
+            actor._np_ref = points_arr
 
-            print(f"✅ 创建线段演员成功 (杆塔{index})")
+            log.debug("✅ 创建线段演员成功 (杆塔%d)", index)
             return actor
 
         except Exception as e:
-            print(f"创建线段演员失败: {e}")
+            log.warning("创建线段演员失败: %s", e)
             return None
 
     def create_box_actor(self, center, size, color=(1, 0, 0), index=0):
         """创建盒子演员"""
         try:
-            cx, cy, cz = center
-            dx, dy, dz = size
-
             # 创建8个顶点
+            vertices = (np.asarray(center, dtype=np.float32)
+                        + _BOX_CORNER_SIGNS * (np.asarray(size, dtype=np.float32) / 2))
             points = vtk.vtkPoints()
-            vertices = [
-                [cx - dx / 2, cy - dy / 2, cz - dz / 2],  # 0
-                [cx + dx / 2, cy - dy / 2, cz - dz / 2],  # 1
-                [cx + dx / 2, cy + dy / 2, cz - dz / 2],  # 2
-                [cx - dx / 2, cy + dy / 2, cz - dz / 2],  # 3
-                [cx - dx / 2, cy - dy / 2, cz + dz / 2],  # 4
-                [cx + dx / 2, cy - dy / 2, cz + dz / 2],  # 5
-                [cx + dx / 2, cy + dy / 2, cz + dz / 2],  # 6
-                [cx - dx / 2, cy + dy / 2, cz + dz / 2],  # 7
-            ]
-
-            for vertex in vertices:
-                points.InsertNextPoint(vertex[0], vertex[1], vertex[2])
+            points.SetData(numpy_support.numpy_to_vtk(vertices, deep=True, array_type=vtk.VTK_FLOAT))
 
             # 创建12条边
-            lines = vtk.vtkCellArray()
-            edges = [
-                (0, 1), (1, 2), (2, 3), (3, 0),  # 底面
-                (4, 5), (5, 6), (6, 7), (7, 4),  # 顶面
-                (0, 4), (1, 5), (2, 6), (3, 7)  # 竖直边
-            ]
-
-            for edge in edges:
-                line = vtk.vtkLine()
-                line.GetPointIds().SetId(0, edge[0])
-                line.GetPointIds().SetId(1, edge[1])
-                lines.InsertNextCell(line)
+            lines = _make_line_cells(_BOX_EDGES)
 
             # 创建多边形数据
             poly_data = vtk.vtkPolyData()
@@ -276,25 +379,31 @@ class VTKPointCloudWidget(QWidget):
             actor.GetProperty().SetColor(color)
             actor.GetProperty().SetLineWidth(4)  # 加粗线条
 
-            print(f"✅ 创建盒子演员成功 (杆塔{index})")
+            log.debug("✅ 创建盒子演员成功 (杆塔%d)", index)
             return actor
 
         except Exception as e:
-            print(f"创建盒子演员失败: {e}")
+            log.warning("创建盒子演员失败: %s", e)
             return None
 
     def reset_camera_and_render(self):
         """重置相机并渲染"""
         try:
-            # 重置相机以适应所有对象
-            self.renderer.ResetCamera()
+            # 获取场景边界，与上次相同时保持当前相机，只渲染
+            bounds = self.renderer.ComputeVisiblePropBounds()
+            bounds_key = tuple(round(b, 3) for b in bounds) if bounds else None
+            if bounds_key is not None and bounds_key == self._last_bounds_key:
+                self.vtk_widget.GetRenderWindow().Render()
+                return
+            self._last_bounds_key = bounds_key
+
+            # 重置相机以适应所有对象（复用已计算的边界）
+            self.renderer.ResetCamera(bounds)
 
             # 设置相机参数
             camera = self.renderer.GetActiveCamera()
             camera.SetViewAngle(30)
 
-            # 获取场景边界
-            bounds = self.renderer.ComputeVisiblePropBounds()
             if bounds and len(bounds) >= 6:
                 # 计算场景中心和大小
                 center = [(bounds[1] + bounds[0]) / 2,
@@ -314,9 +423,9 @@ class VTKPointCloudWidget(QWidget):
 
             # 渲染
             self.vtk_widget.GetRenderWindow().Render()
-            print("✅ 相机重置和渲染完成")
+            log.debug("✅ 相机重置和渲染完成")
 
         except Exception as e:
-            print(f"重置相机失败: {e}")
+            log.warning("重置相机失败: %s", e)
             # 即使失败也尝试基本渲染
             self.vtk_widget.GetRenderWindow().Render()
\ No newline at end of file
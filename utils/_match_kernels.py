@@ -0,0 +1,73 @@
+# _match_kernels.py
+# 杆塔匹配的编译内核，numba不可用时按普通Python函数执行
+
+import math
+import numpy as np
+
+try:
+    from numba import njit
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+
+    def njit(*args, **kwargs):
+        """numba不可用时的空装饰器，原样返回被装饰函数"""
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
+
+
+@njit(cache=True, fastmath=True)
+def match_kernel(gim_lat, gim_lon, gim_h, pc_lat, pc_lon, pc_h, a_thresh, h_thresh,
+                 use_equirect=False, cos_lat_ref=1.0, d2_gate=0.0):
+    """
+    逐对比较GIM杆塔与点云杆塔，每个GIM杆塔取第一个满足条件的点云杆塔
+
+    参数:
+        gim_lat, gim_lon, gim_h: GIM杆塔纬度、经度（度）和高度数组
+        pc_lat, pc_lon, pc_h: 点云杆塔纬度、经度（度）和高度数组
+        a_thresh: 距离阈值对应的 haversine 中间量阈值 sin²(d/2R)，比较时无需开方
+        h_thresh: 高差阈值（米）
+        use_equirect: 为True时先用等距圆柱近似放宽粗筛，通过的组合再用 haversine 确认
+        cos_lat_ref: 粗筛使用的纬度余弦，应取各杆塔中最小值，使近似距离不大于真实距离
+        d2_gate: 粗筛阈值 (d·margin/R)²
+
+    返回:
+        (gim_idx, pc_idx, count)，前 count 个元素为匹配结果
+    """
+    n = gim_lat.shape[0]
+    m = pc_lat.shape[0]
+    deg2rad = math.pi / 180.0
+
+    pc_lat_rad = np.empty(m)
+    pc_lon_rad = np.empty(m)
+    pc_cos_lat = np.empty(m)
+    for j in range(m):
+        pc_lat_rad[j] = pc_lat[j] * deg2rad
+        pc_lon_rad[j] = pc_lon[j] * deg2rad
+        pc_cos_lat[j] = math.cos(pc_lat_rad[j])
+
+    gim_idx = np.empty(n, dtype=np.int64)
+    pc_idx = np.empty(n, dtype=np.int64)
+    count = 0
+    for i in range(n):
+        lat1 = gim_lat[i] * deg2rad
+        lon1 = gim_lon[i] * deg2rad
+        cos_lat1 = math.cos(lat1)
+        h1 = gim_h[i]
+        for j in range(m):
+            if abs(h1 - pc_h[j]) > h_thresh:
+                continue
+            if use_equirect:
+                dx = (pc_lon_rad[j] - lon1) * cos_lat_ref
+                dy = pc_lat_rad[j] - lat1
+                if dx * dx + dy * dy > d2_gate:
+                    continue
+            s_lat = math.sin((pc_lat_rad[j] - lat1) * 0.5)
+            s_lon = math.sin((pc_lon_rad[j] - lon1) * 0.5)
+            if s_lat * s_lat + cos_lat1 * pc_cos_lat[j] * s_lon * s_lon <= a_thresh:
+                gim_idx[count] = i
+                pc_idx[count] = j
+                count += 1
+                break
+    return gim_idx, pc_idx, count
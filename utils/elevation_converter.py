@@ -3,18 +3,25 @@
 
 import pyproj
 import os
+from functools import lru_cache
 import numpy as np
 
 
+# 未指定作业区域时用于预热转换器的经纬度（长沙地区）
+DEFAULT_WARMUP_LON_LAT = (112.94, 28.23)
+
+
 class ElevationConverter:
     """椭球高到正高的转换器"""
 
-    def __init__(self, region_n_value=25.0):
+    def __init__(self, region_n_value=25.0, area_of_interest=None):
         """
         初始化转换器
         :param region_n_value: 区域经验N值（默认长沙地区约25米）
+        :param area_of_interest: 作业区域 (west, south, east, north)，用于预热转换器
         """
         self.region_n_value = region_n_value
+        self.area_of_interest = area_of_interest
         self.transformer = None
         self.init_transformer()
 
@@ -29,11 +36,24 @@ class ElevationConverter:
             self.transformer = pyproj.Transformer.from_pipeline(
                 "+proj=vgridshift +grids=egm08_25.gtx +multiplier=1"
             )
+            self._warm_up()
             print("✅ EGM2008转换器初始化成功")
         except Exception as e:
             print(f"⚠️ EGM2008转换器初始化失败，将使用经验值: {str(e)}")
             self.transformer = None
 
+    def _warm_up(self):
+        """在作业区域中心做一次转换，让PROJ提前完成格网加载等延迟初始化"""
+        if self.area_of_interest:
+            west, south, east, north = self.area_of_interest
+            lon, lat = (west + east) / 2, (south + north) / 2
+        else:
+            lon, lat = DEFAULT_WARMUP_LON_LAT
+        try:
+            self.transformer.transform(lon, lat, 0.0)
+        except Exception as e:
+            print(f"⚠️ EGM2008转换器预热失败: {str(e)}")
+
     def ellipsoid_to_orthometric(self, lat, lon, ellipsoid_height):
         """
         将椭球高转换为正高
@@ -54,18 +74,43 @@ class ElevationConverter:
             print(f"高程转换失败，使用经验值: {str(e)}")
             return ellipsoid_height - self.region_n_value
 
-    def convert_batch(self, lat_array, lon_array, ellipsoid_heights):
+    def convert_batch(self, lat_array, lon_array, ellipsoid_heights, return_applied=False):
         """
         批量转换椭球高到正高
         :param lat_array: 纬度数组
         :param lon_array: 经度数组
         :param ellipsoid_heights: 椭球高数组
-        :return: 正高数组
+        :param return_applied: 为True时同时返回逐点标记，表示该点是否由EGM2008转换（False为经验值回退）
+        :return: 正高数组；return_applied为True时返回 (正高数组, 标记数组)
         """
-        ortho_heights = []
-        for lat, lon, h in zip(lat_array, lon_array, ellipsoid_heights):
-            ortho_heights.append(self.ellipsoid_to_orthometric(lat, lon, h))
-        return np.array(ortho_heights)
+        lats = np.asarray(lat_array, dtype=np.float64)
+        lons = np.asarray(lon_array, dtype=np.float64)
+        heights = np.asarray(ellipsoid_heights, dtype=np.float64)
+        fallback = heights - self.region_n_value
+        ortho_heights, applied = fallback, np.zeros(heights.shape, dtype=bool)
+        try:
+            if self.transformer:
+                # 整个数组交给PROJ一次转换，格网外的点返回inf，这些点逐点回退到经验值
+                _, _, converted = self.transformer.transform(lons, lats, heights)
+                converted = np.asarray(converted, dtype=np.float64)
+                applied = np.isfinite(converted)
+                ortho_heights = np.where(applied, converted, fallback)
+        except Exception as e:
+            print(f"批量高程转换失败，使用经验值: {str(e)}")
+        if return_applied:
+            return ortho_heights, applied
+        return ortho_heights
+
+
+@lru_cache(maxsize=4)
+def get_elevation_converter(region_n_value=25.0, area_of_interest=None):
+    """
+    按区域N值缓存转换器，EGM2008格网只在首次使用时加载
+    :param region_n_value: 区域经验N值
+    :param area_of_interest: 作业区域 (west, south, east, north)，需为元组
+    :return: ElevationConverter
+    """
+    return ElevationConverter(region_n_value, area_of_interest)
 
 
 # 便捷函数
@@ -78,5 +123,5 @@ def convert_elevation(lat, lon, ellipsoid_height, region_n_value=25.0):
     :param region_n_value: 区域经验N值
     :return: 正高(米)
     """
-    converter = ElevationConverter(region_n_value)
+    converter = get_elevation_converter(region_n_value)
     return converter.ellipsoid_to_orthometric(lat, lon, ellipsoid_height)
\ No newline at end of file
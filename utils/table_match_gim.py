@@ -1,19 +1,36 @@
+import logging
 import math
+from dataclasses import dataclass
+from functools import lru_cache
+from itertools import cycle
 import numpy as np
 import pandas as pd
 from pyproj import Transformer
-from PyQt5.QtWidgets import (QWidget, QHBoxLayout, QTableWidget,
-                             QTableWidgetItem, QHeaderView)
-from PyQt5.QtCore import Qt
-from PyQt5.QtGui import QColor
-
-from PyQt5.QtWidgets import QLabel, QTableWidget, QTableWidgetItem, QVBoxLayout, QWidget, QHBoxLayout
-from PyQt5.QtCore import Qt
+from sklearn.neighbors import BallTree
+from PyQt5.QtWidgets import (QWidget, QHBoxLayout, QVBoxLayout, QLabel,
+                             QHeaderView, QTableView)
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex
+from PyQt5.QtGui import QColor, QBrush
 
 # 🔧 新增：导入高程转换器
-from utils.elevation_converter import ElevationConverter
+from utils.elevation_converter import get_elevation_converter
+from utils._match_kernels import HAS_NUMBA, njit, match_kernel
+
+log = logging.getLogger(__name__)
+
+EARTH_RADIUS = 6371000.0  # 地球半径（米）
+_DEG2RAD = math.pi / 180.0  # 角度转弧度系数
+EQUIRECT_MARGIN = 1.01  # 等距圆柱近似粗筛时的距离放宽系数，保证不漏掉临界点
+BALLTREE_MIN_POINTS = 64  # 点云杆塔数少于此值时直接广播计算，建树不划算
+
+
+@lru_cache(maxsize=4)
+def _get_transformer(src_crs="EPSG:4547", dst_crs="EPSG:4326"):
+    """缓存坐标转换器，避免每次匹配/校对都重新构建PROJ管线；默认 CGCS2000 -> WGS84"""
+    return Transformer.from_crs(src_crs, dst_crs, always_xy=True)
 
 
+@njit(cache=True, fastmath=True)
 def haversine(lat1, lon1, lat2, lon2):
     """
     使用Haversine公式计算地球上两点之间的距离（单位：米）
@@ -26,7 +43,10 @@ def haversine(lat1, lon1, lat2, lon2):
         两点之间的距离（米）
     """
     R = 6371.0  # 地球半径（公里）
-    lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
+    lat1 = lat1 * _DEG2RAD
+    lon1 = lon1 * _DEG2RAD
+    lat2 = lat2 * _DEG2RAD
+    lon2 = lon2 * _DEG2RAD
     dlat = lat2 - lat1
     dlon = lon2 - lon1
     a = math.sin(dlat / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon / 2) ** 2
@@ -34,6 +54,37 @@ def haversine(lat1, lon1, lat2, lon2):
     return R * c * 1000  # 转换为米
 
 
+@dataclass
+class TowerBatch:
+    """转换后的点云杆塔，按列存放（SoA），匹配和建表直接使用数组"""
+    ids: list  # 杆塔编号
+    lon: np.ndarray  # 经度(WGS84)
+    lat: np.ndarray  # 纬度(WGS84)
+    ortho: np.ndarray  # 正高
+    ellip: np.ndarray  # 椭球高
+    height: np.ndarray  # 杆塔高度
+    north: np.ndarray  # 北方向偏角
+    original: np.ndarray  # 原始椭球高坐标(CGCS2000)，形状 (N, 3)
+    applied: np.ndarray  # 是否由EGM2008完成高程转换（False为区域经验N值回退）
+
+    def __len__(self):
+        return len(self.ids)
+
+    def to_dicts(self):
+        """转换为原先的字典列表格式，供保存等仍按字典访问的代码使用"""
+        return [{
+            'id': self.ids[i],
+            'converted_center': [float(self.lon[i]), float(self.lat[i]), float(self.ortho[i])],
+            'height': float(self.height[i]),
+            'north_angle': float(self.north[i]),
+            'original_center': self.original[i].tolist(),
+            'ellipsoid_height': float(self.ellip[i]),
+            'orthometric_height': float(self.ortho[i]),
+            'n_value': float(self.ellip[i] - self.ortho[i]),
+            'height_conversion_applied': bool(self.applied[i])
+        } for i in range(len(self.ids))]
+
+
 def convert_pointcloud_ellipsoid_to_orthometric(pointcloud_towers, transformer, region_n_value=25.0):
     """
     🔧 新增函数：将点云杆塔数据从椭球高转换为正高
@@ -45,105 +96,66 @@ def convert_pointcloud_ellipsoid_to_orthometric(pointcloud_towers, transformer,
         region_n_value: 区域N值（默认25米）
 
     返回:
-        转换后的点云杆塔列表，包含正高信息
+        TowerBatch，转换后的点云杆塔（含正高信息）
     """
-    print("🔄 开始将点云杆塔高程从椭球高转换为正高...")
-    print(f"📍 原始点云杆塔数量: {len(pointcloud_towers)}")
-
-    # 初始化高程转换器
-    try:
-        elev_converter = ElevationConverter(region_n_value=region_n_value)
-        print(f"✅ 高程转换器初始化成功，区域N值: {region_n_value}m")
-    except Exception as e:
-        print(f"⚠️ 高程转换器初始化失败: {str(e)}")
-        print("将使用区域经验N值进行转换")
-        elev_converter = ElevationConverter(region_n_value=region_n_value)
-
-    converted_towers = []
-
-    for i, tower in enumerate(pointcloud_towers):
-        try:
-            # 🔧 关键：获取tower_extraction.py输出的椭球高坐标（CGCS2000）
-            original_center = tower['center']  # [x_cgcs2000, y_cgcs2000, z_ellipsoid]
-
-            print(f"🔄 处理杆塔{i + 1}: 原始中心 {original_center}")
-
-            # 步骤1：CGCS2000坐标转换到WGS84经纬度
-            lon_wgs84, lat_wgs84 = transformer.transform(
-                original_center[0],  # X坐标 (CGCS2000)
-                original_center[1]  # Y坐标 (CGCS2000)
-            )
+    log.info("🔄 开始将点云杆塔高程从椭球高转换为正高...")
+    log.info("📍 原始点云杆塔数量: %d", len(pointcloud_towers))
+
+    # 获取高程转换器（缓存复用；EGM2008不可用时转换器自身会退回区域经验N值）
+    elev_converter = get_elevation_converter(region_n_value)
+    if elev_converter.transformer is None:
+        log.warning("将使用区域经验N值进行转换，区域N值: %sm", region_n_value)
+
+    n = len(pointcloud_towers)
+
+    # 🔧 关键：获取tower_extraction.py输出的椭球高坐标（CGCS2000），整批转换
+    centers = np.array([tower['center'] for tower in pointcloud_towers], dtype=np.float64).reshape(-1, 3)
+    ellipsoid_heights = centers[:, 2]  # Z坐标就是椭球高
+
+    # 步骤1：CGCS2000坐标批量转换到WGS84经纬度
+    if n:
+        lons, lats = transformer.transform(centers[:, 0], centers[:, 1])
+        lons = np.asarray(lons, dtype=np.float64)
+        lats = np.asarray(lats, dtype=np.float64)
+    else:
+        lons = lats = np.empty(0, dtype=np.float64)
+
+    # 步骤2：椭球高批量转换为正高；EGM2008不可用或格网外的点由转换器回退到区域经验N值，并逐点标记
+    orthometric_heights, conversion_applied = elev_converter.convert_batch(
+        lats, lons, ellipsoid_heights, return_applied=True)
+
+    batch = TowerBatch(
+        ids=[f"PC-{i + 1}" for i in range(n)],  # 初始编号
+        lon=lons,
+        lat=lats,
+        ortho=orthometric_heights,
+        ellip=ellipsoid_heights,
+        height=np.array([tower.get('height', 0) for tower in pointcloud_towers], dtype=np.float64),
+        north=np.array([tower.get('north_angle', 0) for tower in pointcloud_towers], dtype=np.float64),
+        original=centers,
+        applied=conversion_applied
+    )
 
-            # 步骤2：椭球高转换为正高
-            ellipsoid_height = original_center[2]  # Z坐标就是椭球高
-            orthometric_height = elev_converter.ellipsoid_to_orthometric(
-                lat_wgs84, lon_wgs84, ellipsoid_height
-            )
+    if log.isEnabledFor(logging.DEBUG):
+        for i in range(n):
+            log.debug("📊 杆塔%d: 椭球高 %.2fm → 正高 %.2fm (N=%.2fm)",
+                      i + 1, ellipsoid_heights[i], orthometric_heights[i],
+                      ellipsoid_heights[i] - orthometric_heights[i])
 
-            # 🔧 创建包含正高的转换后坐标
-            converted_center = [lon_wgs84, lat_wgs84, orthometric_height]
-
-            # 创建转换后的杆塔信息
-            converted_tower = {
-                'id': f"PC-{i + 1}",  # 初始编号
-                'converted_center': converted_center,  # [lon_wgs84, lat_wgs84, orthometric_height]
-                'height': tower.get('height', 0),
-                'north_angle': tower.get('north_angle', 0),
-                'original_center': original_center,  # 保留原始椭球高坐标(CGCS2000)
-                # 🔧 详细的高程信息
-                'ellipsoid_height': ellipsoid_height,
-                'orthometric_height': orthometric_height,
-                'n_value': ellipsoid_height - orthometric_height,  # 计算的N值
-                'height_conversion_applied': True  # 标记已进行高程转换
-            }
-
-            converted_towers.append(converted_tower)
-
-            print(
-                f"📊 杆塔{i + 1}: 椭球高 {ellipsoid_height:.2f}m → 正高 {orthometric_height:.2f}m (N={ellipsoid_height - orthometric_height:.2f}m)")
-
-        except Exception as e:
-            print(f"⚠️ 杆塔{i + 1} 高程转换失败: {str(e)}")
-            # 转换失败时，创建备用数据（使用椭球高）
-            try:
-                lon_wgs84, lat_wgs84 = transformer.transform(
-                    tower['center'][0],
-                    tower['center'][1]
-                )
-                converted_center = [lon_wgs84, lat_wgs84, tower['center'][2]]
-
-                converted_tower = {
-                    'id': f"PC-{i + 1}",
-                    'converted_center': converted_center,
-                    'height': tower.get('height', 0),
-                    'north_angle': tower.get('north_angle', 0),
-                    'original_center': tower['center'],
-                    'ellipsoid_height': tower['center'][2],
-                    'orthometric_height': tower['center'][2],  # 转换失败时使用椭球高
-                    'n_value': 0,
-                    'height_conversion_applied': False
-                }
-                converted_towers.append(converted_tower)
-                print(f"⚠️ 杆塔{i + 1} 使用椭球高作为备选")
-            except Exception as e2:
-                print(f"❌ 杆塔{i + 1} 完全处理失败: {str(e2)}")
-                continue
-
-    print(f"✅ 点云杆塔高程转换完成，共处理 {len(converted_towers)} 个杆塔")
+    log.info("✅ 点云杆塔高程转换完成，共处理 %d 个杆塔", n)
 
     # 统计转换情况
-    successful_conversions = sum(1 for t in converted_towers if t['height_conversion_applied'])
+    successful_conversions = int(np.count_nonzero(batch.applied))
     if successful_conversions > 0:
-        n_values = [t['n_value'] for t in converted_towers if t['height_conversion_applied']]
-        avg_n_value = np.mean(n_values)
-        print(f"📊 成功转换: {successful_conversions}/{len(converted_towers)} 个杆塔")
-        print(f"📊 平均N值: {avg_n_value:.2f}m")
+        avg_n_value = np.mean((batch.ellip - batch.ortho)[batch.applied])
+        log.info("📊 成功转换: %d/%d 个杆塔", successful_conversions, n)
+        log.info("📊 平均N值: %.2fm", avg_n_value)
 
-    return converted_towers
+    return batch
 
 
 def match_towers(gim_list, pointcloud_towers, transformer, distance_threshold=50, height_threshold=100,
-                 region_n_value=25.0):
+                 region_n_value=25.0, use_equirect=True):
     """
     🔧 修改后的匹配函数：在匹配阶段进行椭球高到正高转换
 
@@ -154,119 +166,261 @@ def match_towers(gim_list, pointcloud_towers, transformer, distance_threshold=50
         distance_threshold: 经纬度距离阈值（米）
         height_threshold: 高度差阈值（米）
         region_n_value: 区域N值（米）
+        use_equirect: 是否先用等距圆柱近似粗筛（最终判定始终为haversine）
 
     返回:
-        匹配成功的行索引列表[(gim_index, pc_index)]，以及转换后的点云杆塔数据
+        匹配成功的行索引列表[(gim_index, pc_index)]，以及转换后的点云杆塔数据（TowerBatch）
     """
-    print("🔍 开始杆塔匹配（在匹配阶段进行高程转换）...")
+    log.info("🔍 开始杆塔匹配（在匹配阶段进行高程转换）...")
 
     # 🔧 关键步骤：将点云杆塔从椭球高转换为正高
-    converted_towers = convert_pointcloud_ellipsoid_to_orthometric(pointcloud_towers, transformer, region_n_value)
+    converted = convert_pointcloud_ellipsoid_to_orthometric(pointcloud_towers, transformer, region_n_value)
 
-    print(f"🔍 开始执行匹配算法...")
-    matched_rows = []
+    log.info("🔍 开始执行匹配算法...")
+    if not gim_list or not len(converted):
+        log.info("🎉 匹配完成，共找到 0 对匹配的杆塔")
+        return [], converted
 
-    for i, gim_tower in enumerate(gim_list):
-        # 获取GIM杆塔位置信息（假设GIM中已经是正高）
-        gim_lat = gim_tower.get("lat", 0)
-        gim_lon = gim_tower.get("lng", 0)
-        gim_height = gim_tower.get("h", 0)  # GIM中的高度（正高）
+    # GIM杆塔位置信息（假设GIM中已经是正高）
+    gim_lat, gim_lon, gim_h = gim_coordinate_arrays(gim_list)
 
-        print(f"🔍 匹配GIM杆塔{i + 1}: 位置({gim_lat:.6f}, {gim_lon:.6f}), 正高{gim_height:.2f}m")
+    # 🔧 关键：使用转换后的正高数据进行匹配（WGS84 + 正高）
+    pc_lon, pc_lat, pc_h = converted.lon, converted.lat, converted.ortho
 
-        # 🔧 关键：使用转换后的正高数据进行匹配
-        for j, pc_tower in enumerate(converted_towers):
-            # 获取点云杆塔转换后的位置信息（WGS84 + 正高）
-            pc_lon = pc_tower['converted_center'][0]  # 经度(WGS84)
-            pc_lat = pc_tower['converted_center'][1]  # 纬度(WGS84)
-            pc_height = pc_tower['converted_center'][2]  # 🔧 现在是正高！
+    matched_rows = match_tower_arrays(gim_lat, gim_lon, gim_h, pc_lat, pc_lon, pc_h,
+                                      distance_threshold, height_threshold, use_equirect)
 
-            # 计算距离并检查是否匹配
-            distance = haversine(gim_lat, gim_lon, pc_lat, pc_lon)
-            height_diff = abs(gim_height - pc_height)  # 🔧 现在是正高与正高的比较
+    if log.isEnabledFor(logging.DEBUG):
+        for i, j in matched_rows:
+            log.debug("  ✅ 匹配成功！GIM杆塔%d ↔ 点云杆塔%d (距离%.1fm, 高差%.1fm)",
+                      i + 1, j + 1, haversine(gim_lat[i], gim_lon[i], pc_lat[j], pc_lon[j]),
+                      abs(gim_h[i] - pc_h[j]))
 
-            print(f"  📐 vs 点云杆塔{j + 1}: 距离{distance:.1f}m, 高差{height_diff:.1f}m (正高{pc_height:.2f}m)")
+    log.info("🎉 匹配完成，共找到 %d 对匹配的杆塔", len(matched_rows))
+    return matched_rows, converted
 
-            if distance <= distance_threshold and height_diff <= height_threshold:
-                matched_rows.append((i, j))
-                print(f"  ✅ 匹配成功！GIM杆塔{i + 1} ↔ 点云杆塔{j + 1}")
-                break
 
-    print(f"🎉 匹配完成，共找到 {len(matched_rows)} 对匹配的杆塔")
-    return matched_rows, converted_towers
+def haversine_a_threshold(distance_threshold):
+    """距离阈值对应的 haversine 中间量 a 的阈值：d <= T 等价于 a <= sin²(T/2R)"""
+    return math.sin(distance_threshold / (2 * EARTH_RADIUS)) ** 2
 
 
-def create_tower_table(headers, data, row_count=None):
-    table = QTableWidget()
+def gim_coordinate_arrays(gim_list):
+    """一次性取出GIM杆塔的纬度、经度、高度数组，匹配计算只在数组上进行"""
+    n = len(gim_list)
+    gim_lat = np.fromiter((t.get("lat", 0) for t in gim_list), dtype=np.float64, count=n)
+    gim_lon = np.fromiter((t.get("lng", 0) for t in gim_list), dtype=np.float64, count=n)
+    gim_h = np.fromiter((t.get("h", 0) for t in gim_list), dtype=np.float64, count=n)
+    return gim_lat, gim_lon, gim_h
+
+
+def _equirect_sq(lat1, lon1, lat2, lon2, cos_lat_ref):
+    """等距圆柱近似下两点角距离的平方（弧度²），小范围内与大圆距离几乎一致"""
+    dx = (lon2 - lon1) * cos_lat_ref
+    dy = lat2 - lat1
+    return dx * dx + dy * dy
+
+
+def match_tower_arrays(gim_lat, gim_lon, gim_h, pc_lat, pc_lon, pc_h,
+                       distance_threshold=50, height_threshold=100, use_equirect=True):
+    """
+    按坐标数组匹配杆塔，每个GIM杆塔取第一个满足距离和高差条件的点云杆塔
+
+    use_equirect 为True时，先用等距圆柱近似按放宽的阈值粗筛（纬度余弦取所有杆塔中的最小值，
+    近似距离不会大于真实距离），通过粗筛的组合再用 haversine 确认；为False时直接逐对计算haversine。
+    两种方式的匹配结果一致
 
-    # 设置表格行数和列数
+    返回:
+        匹配成功的行索引列表[(gim_index, pc_index)]
+    """
+    if len(gim_lat) == 0 or len(pc_lat) == 0:
+        return []
+
+    if len(pc_lat) < BALLTREE_MIN_POINTS:
+        max_abs_lat = max(float(np.max(np.abs(gim_lat))), float(np.max(np.abs(pc_lat))))
+        cos_lat_ref = math.cos(max_abs_lat * _DEG2RAD)
+        d2_gate = (distance_threshold * EQUIRECT_MARGIN / EARTH_RADIUS) ** 2
+        a_thresh = haversine_a_threshold(distance_threshold)
+
+        if HAS_NUMBA:
+            # 编译内核逐对比较，找到首个匹配即跳出，不生成距离矩阵
+            gim_idx, pc_idx, count = match_kernel(
+                gim_lat, gim_lon, gim_h,
+                np.ascontiguousarray(pc_lat), np.ascontiguousarray(pc_lon), np.ascontiguousarray(pc_h),
+                a_thresh, float(height_threshold),
+                use_equirect, cos_lat_ref, d2_gate
+            )
+            return list(zip(gim_idx[:count].tolist(), pc_idx[:count].tolist()))
+
+        # 先用高差筛掉大部分组合，只对剩余组合计算距离
+        mask = np.abs(gim_h[:, None] - pc_h[None, :]) <= height_threshold  # 🔧 现在是正高与正高的比较
+        gi, pj = np.nonzero(mask)
+        if len(gi) == 0:
+            return []
+        g_lat, g_lon = np.radians(gim_lat[gi]), np.radians(gim_lon[gi])
+        p_lat, p_lon = np.radians(pc_lat[pj]), np.radians(pc_lon[pj])
+        if use_equirect:
+            # 等距圆柱近似只做放宽粗筛，不通过的组合直接判为不匹配
+            gate = _equirect_sq(g_lat, g_lon, p_lat, p_lon, cos_lat_ref) <= d2_gate
+            mask[gi[~gate], pj[~gate]] = False
+            gi, pj = gi[gate], pj[gate]
+            g_lat, g_lon, p_lat, p_lon = g_lat[gate], g_lon[gate], p_lat[gate], p_lon[gate]
+        # 距离随 haversine 中间量 a 单调递增，直接比较 a 与 sin²(d/2R)，省去 sqrt 和 atan2
+        a = (np.sin((p_lat - g_lat) / 2) ** 2
+             + np.cos(g_lat) * np.cos(p_lat) * np.sin((p_lon - g_lon) / 2) ** 2)
+        mask[gi, pj] = a <= a_thresh
+
+        # argmax 返回每行第一个 True，与逐个比较后 break 的结果一致
+        has_match = mask.any(axis=1)
+        first = np.argmax(mask, axis=1)
+        return list(zip(np.flatnonzero(has_match).tolist(), first[has_match].tolist()))
+
+    # 点云杆塔较多时使用 haversine 度量的 BallTree 做半径查询
+    tree = BallTree(np.radians(np.column_stack([pc_lat, pc_lon])), metric='haversine')
+    candidates = tree.query_radius(np.radians(np.column_stack([gim_lat, gim_lon])),
+                                   r=distance_threshold / EARTH_RADIUS)
+    # 与编译内核相同的输出形式：按GIM杆塔数预分配索引缓冲区，末尾按计数截取
+    gim_idx = np.empty(len(gim_lat), dtype=np.int64)
+    pc_idx = np.empty(len(gim_lat), dtype=np.int64)
+    count = 0
+    for i, idxs in enumerate(candidates):
+        idxs = np.sort(idxs)  # 按点云序号排序，保持"首个匹配"语义
+        ok = idxs[np.abs(gim_h[i] - pc_h[idxs]) <= height_threshold]
+        if len(ok):
+            gim_idx[count] = i
+            pc_idx[count] = ok[0]
+            count += 1
+    return list(zip(gim_idx[:count].tolist(), pc_idx[:count].tolist()))
+
+
+class TowerTableModel(QAbstractTableModel):
+    """杆塔表格模型：单元格文本按需返回，高亮按行记录背景色，不为每个单元格创建Item"""
+
+    def __init__(self, headers, rows, parent=None):
+        super().__init__(parent)
+        self._headers = list(headers)
+        self._last_col = len(self._headers) - 1
+        self._rows = rows
+        self._bg = {}
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._headers)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self._headers[section]
+        return super().headerData(section, orientation, role)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role in (Qt.DisplayRole, Qt.EditRole):
+            row = self._rows[index.row()]
+            return row[index.column()] if index.column() < len(row) else None
+        if role == Qt.TextAlignmentRole:
+            return Qt.AlignCenter
+        if role == Qt.BackgroundRole:
+            return self._bg.get(index.row())
+        return None
+
+    def flags(self, index):
+        return super().flags(index) | Qt.ItemIsEditable
+
+    def setData(self, index, value, role=Qt.EditRole):
+        return role == Qt.EditRole and self.set_text(index.row(), index.column(), value)
+
+    def set_text(self, row, col, text):
+        """修改单元格文本，单元格不存在时返回False"""
+        if col >= len(self._rows[row]):
+            return False
+        self._rows[row][col] = str(text)
+        index = self.index(row, col)
+        self.dataChanged.emit(index, index)
+        return True
+
+    def set_highlight(self, row, brush):
+        """设置整行背景画刷（传入预先构造的QBrush，避免绘制时逐格由QColor转换）"""
+        self._bg[row] = brush
+        self.dataChanged.emit(self.index(row, 0), self.index(row, self._last_col),
+                              [Qt.BackgroundRole])
+
+
+def create_tower_table(headers, data, row_count=None):
+    # 设置表格行数
     if row_count is None:
         row_count = len(data)
-    table.setRowCount(row_count)
-    table.setColumnCount(len(headers))
-    table.setHorizontalHeaderLabels(headers)
-
-    # 填充数据
-    for row in range(row_count):
-        if row < len(data):
-            row_data = data[row]
-            for col in range(min(len(row_data), table.columnCount())):
-                item = QTableWidgetItem(str(row_data[col]))
-                item.setTextAlignment(Qt.AlignCenter)
-                table.setItem(row, col, item)
+    rows = [[str(x) for x in row[:len(headers)]] for row in data[:row_count]]
+    rows.extend([] for _ in range(row_count - len(rows)))
+
+    table = QTableView()
+    table.setModel(TowerTableModel(headers, rows, table))
 
     # 自适应列宽
     table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
     return table
 
 
-# 在 table_match_gim.py 中的修改部分
+def table_row_texts(table):
+    """
+    按行读取表格全部单元格文本，经由 model() 访问，QTableView 与 QTableWidget 通用
 
-def match_from_gim_tower_list(tower_list, pointcloud_towers, region_n_value=25.0):
+    返回:
+        行列表，每行为各列文本（空单元格为空字符串）
     """
-    🔧 修改后的匹配功能：在匹配阶段进行高程转换，并以GIM北方向偏角为准更新点云数据
+    model = table.model()
+    index = model.index
+    n_cols = model.columnCount()
+    rows = []
+    for row in range(model.rowCount()):
+        values = [index(row, col).data() for col in range(n_cols)]
+        rows.append(["" if v is None else str(v) for v in values])
+    return rows
+
+
+def _format_rows(ids, lat, lon, height, north):
+    """按列格式化表格数据（编号、纬度、经度、高度、北方向偏角），返回可修改的行列表"""
+    if len(ids) == 0:
+        return []
+    return np.column_stack([
+        np.asarray(ids, dtype=object),
+        np.char.mod('%.6f', np.asarray(lat, dtype=np.float64)),
+        np.char.mod('%.6f', np.asarray(lon, dtype=np.float64)),
+        np.char.mod('%.2f', np.asarray(height, dtype=np.float64)),
+        np.char.mod('%.1f', np.asarray(north, dtype=np.float64))
+    ]).tolist()
+
+
+def gim_table_data(gim_list):
+    """按列格式化GIM杆塔表格数据：编号、纬度、经度、高度、北方向偏角"""
+    gim_lat, gim_lon, gim_h = gim_coordinate_arrays(gim_list)
+    gim_r = np.fromiter((t.get("r", 0) for t in gim_list), dtype=np.float64, count=len(gim_list))
+    ids = [t.get("properties", {}).get("杆塔编号", "") for t in gim_list]
+    return _format_rows(ids, gim_lat, gim_lon, gim_h, gim_r)
+
+
+def _prepare_tables(tower_list, pointcloud_towers, transformer, region_n_value=25.0):
     """
-    print("🚀 启动匹配功能（仅在匹配阶段转换高程）...")
-
-    # 创建坐标转换器 (CGCS2000 -> WGS84)
-    transformer = Transformer.from_crs("EPSG:4547", "EPSG:4326", always_xy=True)
+    匹配与校对共用的准备流程：转换点云杆塔、执行匹配并生成左右两张表格
 
+    返回:
+        (left_data, right_data, converted, matched, table_left, table_right)
+    """
     # 准备左表数据 (GIM杆塔，保持原始数据)
-    left_data = []
-    for t in tower_list:
-        left_data.append([
-            t.get("properties", {}).get("杆塔编号", ""),  # 杆塔编号
-            f"{t.get('lat', 0):.6f}",  # 纬度
-            f"{t.get('lng', 0):.6f}",  # 经度
-            f"{t.get('h', 0):.2f}",  # 高程（正高）
-            f"{t.get('r', 0):.1f}"  # 方向角
-        ])
-
-    # 🔧 关键修改：在匹配阶段执行高程转换
-    matched, converted_towers = match_towers(
+    left_data = gim_table_data(tower_list)
+
+    # 🔧 执行高程转换与匹配
+    matched, converted = match_towers(
         tower_list, pointcloud_towers, transformer,
         region_n_value=region_n_value
     )
 
     # 准备右表数据 (点云杆塔，使用转换后的正高数据)
-    right_data = []
-    for converted_tower in converted_towers:
-        lat = converted_tower['converted_center'][1]
-        lon = converted_tower['converted_center'][0]
-        orthometric_height = converted_tower['converted_center'][2]  # 正高
-
-        height_display = f"{orthometric_height:.2f}"
-
-        # 🔧 新增：默认使用点云的北方向偏角，但如果匹配成功会被GIM数据覆盖
-        north_angle = converted_tower['north_angle']
-
-        right_data.append([
-            converted_tower['id'],  # 杆塔编号
-            f"{lat:.6f}",  # 纬度(WGS84)
-            f"{lon:.6f}",  # 经度(WGS84)
-            height_display,  # 正高
-            f"{north_angle:.1f}"  # 北方向偏角
-        ])
+    # 🔧 默认使用点云的北方向偏角，但如果匹配成功会被GIM数据覆盖
+    right_data = _format_rows(converted.ids, converted.lat, converted.lon,
+                              converted.ortho, converted.north)
 
     # 创建表格
     left_headers = ["杆塔编号", "纬度", "经度", "高程", "北方向偏角"]
@@ -275,6 +429,25 @@ def match_from_gim_tower_list(tower_list, pointcloud_towers, region_n_value=25.0
     right_headers = ["杆塔编号", "纬度(WGS84)", "经度(WGS84)", "高程", "北方向偏角"]
     table_right = create_tower_table(right_headers, right_data)
 
+    return left_data, right_data, converted, matched, table_left, table_right
+
+
+# 在 table_match_gim.py 中的修改部分
+
+def match_from_gim_tower_list(tower_list, pointcloud_towers, region_n_value=25.0):
+    """
+    🔧 修改后的匹配功能：在匹配阶段进行高程转换，并以GIM北方向偏角为准更新点云数据
+    """
+    log.info("🚀 启动匹配功能（仅在匹配阶段转换高程）...")
+
+    # 创建坐标转换器 (CGCS2000 -> WGS84)
+    transformer = _get_transformer()
+
+    left_data, right_data, converted, matched, table_left, table_right = _prepare_tables(
+        tower_list, pointcloud_towers, transformer, region_n_value)
+    left_model = table_left.model()
+    right_model = table_right.model()
+
     # 标签
     left_label = QLabel("数据来源: GIM 数据")
     left_label.setAlignment(Qt.AlignCenter)
@@ -286,34 +459,26 @@ def match_from_gim_tower_list(tower_list, pointcloud_towers, region_n_value=25.0
 
     # 🔧 进行匹配，并更新杆塔编号和北方向偏角
     highlight_colors = [QColor(173, 216, 230), QColor(255, 255, 204), QColor(220, 220, 220)]
-    color_index = 0
+    highlight_brushes = [QBrush(c) for c in highlight_colors]
 
-    for left_row, right_row in matched:
+    for (left_row, right_row), brush in zip(matched, cycle(highlight_brushes)):
         # 获取GIM杆塔的信息
         gim_tower_id = tower_list[left_row].get("properties", {}).get("杆塔编号", "")
         gim_north_angle = tower_list[left_row].get("r", 0)  # 🔧 获取GIM的北方向偏角
 
         # 更新右表的杆塔编号
-        if table_right.item(right_row, 0):
-            table_right.item(right_row, 0).setText(str(gim_tower_id))
+        right_model.set_text(right_row, 0, gim_tower_id)
 
         # 🔧 新增：更新右表的北方向偏角为GIM数据的值
-        if table_right.item(right_row, 4):
-            table_right.item(right_row, 4).setText(f"{gim_north_angle:.1f}")
+        right_model.set_text(right_row, 4, f"{gim_north_angle:.1f}")
 
-        # 同时更新converted_towers中的信息（用于后续保存）
-        converted_towers[right_row]['id'] = str(gim_tower_id)
-        converted_towers[right_row]['north_angle'] = gim_north_angle  # 🔧 更新北方向偏角
+        # 同时更新转换后的点云杆塔信息（用于后续保存）
+        converted.ids[right_row] = str(gim_tower_id)
+        converted.north[right_row] = gim_north_angle  # 🔧 更新北方向偏角
 
         # 高亮显示配对成功的行
-        for col in range(table_left.columnCount()):
-            if table_left.item(left_row, col):
-                table_left.item(left_row, col).setBackground(highlight_colors[color_index])
-        for col in range(table_right.columnCount()):
-            if table_right.item(right_row, col):
-                table_right.item(right_row, col).setBackground(highlight_colors[color_index])
-
-        color_index = (color_index + 1) % len(highlight_colors)
+        left_model.set_highlight(left_row, brush)
+        right_model.set_highlight(right_row, brush)
 
     # 创建面板
     panel = QWidget()
@@ -330,7 +495,7 @@ def match_from_gim_tower_list(tower_list, pointcloud_towers, region_n_value=25.0
     main_layout.addLayout(right_layout)
 
     # 附加转换后的数据到面板对象
-    panel.converted_towers = converted_towers
+    panel.converted_towers = converted.to_dicts()
     panel.matched_pairs = matched
 
     return panel
@@ -340,52 +505,15 @@ def correct_from_gim_tower_list(tower_list, pointcloud_towers, region_n_value=25
     """
     🔧 修改后的校对功能：在校对阶段进行高程转换，并以GIM北方向偏角为准更新点云数据
     """
-    print("🚀 启动校对功能（仅在校对阶段转换高程）...")
+    log.info("🚀 启动校对功能（仅在校对阶段转换高程）...")
 
     # 创建坐标转换器 (CGCS2000 -> WGS84)
-    transformer = Transformer.from_crs("EPSG:4547", "EPSG:4326", always_xy=True)
-
-    # 准备左表数据 (GIM杆塔，保持原始数据)
-    left_data = []
-    for t in tower_list:
-        left_data.append([
-            t.get("properties", {}).get("杆塔编号", ""),  # 杆塔编号
-            f"{t.get('lat', 0):.6f}",  # 纬度
-            f"{t.get('lng', 0):.6f}",  # 经度
-            f"{t.get('h', 0):.2f}",  # 高程（正高）
-            f"{t.get('r', 0):.1f}"  # 方向角
-        ])
-
-    # 🔧 关键修改：在校对阶段执行高程转换
-    matched, converted_towers = match_towers(
-        tower_list, pointcloud_towers, transformer,
-        region_n_value=region_n_value
-    )
-
-    # 准备右表数据 (点云杆塔，使用转换后的正高数据)
-    right_data = []
-    for converted_tower in converted_towers:
-        lat = converted_tower['converted_center'][1]
-        lon = converted_tower['converted_center'][0]
-        orthometric_height = converted_tower['converted_center'][2]  # 正高
-
-        height_display = f"{orthometric_height:.2f}"
-        north_angle = converted_tower['north_angle']
-
-        right_data.append([
-            converted_tower['id'],
-            f"{lat:.6f}",
-            f"{lon:.6f}",
-            height_display,
-            f"{north_angle:.1f}"
-        ])
+    transformer = _get_transformer()
 
-    # 创建表格
-    left_headers = ["杆塔编号", "纬度", "经度", "高程", "北方向偏角"]
-    table_left = create_tower_table(left_headers, left_data)
-
-    right_headers = ["杆塔编号", "纬度(WGS84)", "经度(WGS84)", "高程", "北方向偏角"]
-    table_right = create_tower_table(right_headers, right_data)
+    left_data, right_data, converted, matched, table_left, table_right = _prepare_tables(
+        tower_list, pointcloud_towers, transformer, region_n_value)
+    left_model = table_left.model()
+    right_model = table_right.model()
 
     # 标签
     left_label = QLabel("数据来源: GIM 数据 (校对模式)")
@@ -398,50 +526,35 @@ def correct_from_gim_tower_list(tower_list, pointcloud_towers, region_n_value=25
 
     # 🔧 校对功能：只对配对成功的杆塔进行双向更新
     highlight_colors = [QColor(200, 255, 200), QColor(255, 230, 230), QColor(220, 220, 255)]
-    color_index = 0
-
-    for left_row, right_row in matched:
-        pc_tower = converted_towers[right_row]
+    highlight_brushes = [QBrush(c) for c in highlight_colors]
 
+    for (left_row, right_row), brush in zip(matched, cycle(highlight_brushes)):
         # 步骤1：将左表的杆塔编号更新到右表（只有配对成功的）
         gim_tower_id = tower_list[left_row].get("properties", {}).get("杆塔编号", "")
         gim_north_angle = tower_list[left_row].get("r", 0)  # 🔧 获取GIM的北方向偏角
 
-        if table_right.item(right_row, 0):
-            table_right.item(right_row, 0).setText(str(gim_tower_id))
+        right_model.set_text(right_row, 0, gim_tower_id)
 
         # 🔧 新增：更新右表的北方向偏角为GIM数据的值
-        if table_right.item(right_row, 4):
-            table_right.item(right_row, 4).setText(f"{gim_north_angle:.1f}")
+        right_model.set_text(right_row, 4, f"{gim_north_angle:.1f}")
 
-        # 同时更新converted_towers中的信息（用于后续保存）
-        converted_towers[right_row]['id'] = str(gim_tower_id)
-        converted_towers[right_row]['north_angle'] = gim_north_angle  # 🔧 更新北方向偏角
+        # 同时更新转换后的点云杆塔信息（用于后续保存）
+        converted.ids[right_row] = str(gim_tower_id)
+        converted.north[right_row] = gim_north_angle  # 🔧 更新北方向偏角
 
         # 🔧 步骤2：将右表的正高坐标数据更新到左表（校对GIM数据）
-        if table_left.item(left_row, 1):  # 纬度
-            table_left.item(left_row, 1).setText(f"{pc_tower['converted_center'][1]:.6f}")
-        if table_left.item(left_row, 2):  # 经度
-            table_left.item(left_row, 2).setText(f"{pc_tower['converted_center'][0]:.6f}")
-        if table_left.item(left_row, 3):  # 高程（现在是正高）
-            table_left.item(left_row, 3).setText(f"{pc_tower['converted_center'][2]:.2f}")
+        left_model.set_text(left_row, 1, f"{converted.lat[right_row]:.6f}")  # 纬度
+        left_model.set_text(left_row, 2, f"{converted.lon[right_row]:.6f}")  # 经度
+        left_model.set_text(left_row, 3, f"{converted.ortho[right_row]:.2f}")  # 高程（现在是正高）
 
         # 🔧 修改：左表的北方向偏角保持GIM原值不变（不更新）
         # 原来的代码：table_left.item(left_row, 4).setText(f"{pc_tower['north_angle']:.1f}")
         # 现在：保持GIM的北方向偏角不变
-        if table_left.item(left_row, 4):
-            table_left.item(left_row, 4).setText(f"{gim_north_angle:.1f}")
+        left_model.set_text(left_row, 4, f"{gim_north_angle:.1f}")
 
         # 高亮显示配对成功并已校对的行
-        color = highlight_colors[color_index % len(highlight_colors)]
-        for col in range(table_left.columnCount()):
-            if table_left.item(left_row, col):
-                table_left.item(left_row, col).setBackground(color)
-        for col in range(table_right.columnCount()):
-            if table_right.item(right_row, col):
-                table_right.item(right_row, col).setBackground(color)
-
-        color_index += 1
+        left_model.set_highlight(left_row, brush)
+        right_model.set_highlight(right_row, brush)
 
     panel = QWidget()
     left_layout = QVBoxLayout()
@@ -457,7 +570,7 @@ def correct_from_gim_tower_list(tower_list, pointcloud_towers, region_n_value=25
     main_layout.addLayout(right_layout)
 
     # 附加转换后的数据到面板对象
-    panel.converted_towers = converted_towers
+    panel.converted_towers = converted.to_dicts()
     panel.matched_pairs = matched
 
     return panel
\ No newline at end of file
@@ -2,19 +2,25 @@
 
 import laspy
 import numpy as np
-import trimesh
 from sklearn.cluster import DBSCAN
+from scipy.spatial import cKDTree
+from joblib import Parallel, delayed
 from pathlib import Path
 import gc
 import time
 import math
-import pandas as pd
+from openpyxl import Workbook
 import open3d as o3d
 import os
-import warnings
 
-# 配置环境
-warnings.filterwarnings("ignore", category=UserWarning, module="trimesh")
+try:
+    from numba import njit
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+
+LAS_CHUNK_SIZE = 1_000_000  # 流式读取LAS时每块的点数
+PARALLEL_MIN_CANDIDATES = 32  # 候选簇少于此数时串行分析，线程调度开销高于计算本身
 
 
 def extract_towers(
@@ -28,7 +34,10 @@ def extract_towers(
         min_height=15.0,  # 最小高度
         max_width=50.0,  # 最大宽度
         min_width=8,  # 最小宽度
-        duplicate_threshold=30.0  # 去重阈值
+        duplicate_threshold=30.0,  # 去重阈值
+        voxel_size=1.0,  # 聚类前体素下采样尺寸（米）
+        use_trimesh_obb=False,  # 使用trimesh计算OBB（仅用于结果对照）
+        n_jobs=-1  # 候选簇并行分析的线程数
 
 
 ):
@@ -53,90 +62,166 @@ def extract_towers(
     output_dir = Path("output_towers")
     output_dir.mkdir(exist_ok=True)
 
-    # ==================== 数据读取和预处理 ====================
+    # ==================== 数据读取和高度过滤 ====================
+    # 分块流式读取两遍：第一遍只保留整型Z并累计质心，第二遍只把通过高度过滤的点写入缓冲区，
+    # 避免整块点云及其多份浮点副本同时驻留内存
     try:
         log("📂 读取点云文件...")
         progress(5)
         with laspy.open(input_las_path) as las_file:
-            las = las_file.read()
-            raw_points = np.stack([las.x, las.y, las.z], axis=1).astype(np.float32)
-            centroid = np.mean(raw_points, axis=0)
-            points = raw_points - centroid
+            header = las_file.header
+            sx, sy, sz = header.scales
+            ox, oy, oz = header.offsets
             header_info = {
-                "scales": las.header.scales,
-                "offsets": las.header.offsets,
-                "point_format": las.header.point_format,
-                "version": las.header.version,
-                "centroid": centroid
+                "scales": header.scales,
+                "offsets": header.offsets,
+                "point_format": header.point_format,
+                "version": header.version
             }
-            del las
-            log(f"✅ 点云读取完成，总点数: {len(raw_points)}")
+            total = header.point_count
+            z_raw = np.empty(total, dtype=np.int32)
+            coord_sum = np.zeros(3, dtype=np.float64)
+            n_read = 0
+            for chunk in las_file.chunk_iterator(LAS_CHUNK_SIZE):
+                n = len(chunk)
+                chunk_z = np.asarray(chunk.Z)
+                z_raw[n_read:n_read + n] = chunk_z
+                coord_sum[0] += np.sum(chunk.X, dtype=np.float64)
+                coord_sum[1] += np.sum(chunk.Y, dtype=np.float64)
+                coord_sum[2] += np.sum(chunk_z, dtype=np.float64)
+                n_read += n
+        z_raw = z_raw[:n_read]
+        centroid = coord_sum / n_read * (sx, sy, sz) + (ox, oy, oz)
+        header_info["centroid"] = centroid
+        log(f"✅ 点云读取完成，总点数: {n_read}")
     except Exception as e:
         log(f"⚠️ 文件读取失败: {str(e)}")
         return tower_obbs
 
-    # ==================== 高度过滤优化 ====================
     try:
         log("🔍 执行高度过滤...")
         progress(10)
-        z_values = points[:, 2]
-        base_height = np.percentile(z_values, 25)  # 降低基准高度
-        filtered_points = points[z_values > (base_height + 3.0)]  # 提高过滤阈值
-        log(f"✅ 高度过滤完成，保留点数: {len(filtered_points)}")
-
-        if len(filtered_points) < 1000:
+        # 25%分位数作为基准高度，比例系数为正，整型Z的第k小值即对应高度的第k小值
+        k = (len(z_raw) - 1) // 4
+        base_height = np.partition(z_raw, k)[k] * sz + oz - centroid[2]
+        # 较低阈值换算到整型Z空间，计数与第二遍筛选使用同一判据，缓冲区大小精确
+        z_loose = (base_height + 1.0 + centroid[2] - oz) / sz
+        n_loose = int(np.count_nonzero(z_raw > z_loose))
+        del z_raw
+
+        loose_points = np.empty((n_loose, 3), dtype=np.float32)
+        write_ptr = 0
+        with laspy.open(input_las_path) as las_file:
+            for chunk in las_file.chunk_iterator(LAS_CHUNK_SIZE):
+                keep = np.asarray(chunk.Z) > z_loose
+                m = int(np.count_nonzero(keep))
+                if m == 0:
+                    continue
+                block = loose_points[write_ptr:write_ptr + m]
+                block[:, 0] = np.asarray(chunk.X)[keep] * sx + (ox - centroid[0])
+                block[:, 1] = np.asarray(chunk.Y)[keep] * sy + (oy - centroid[1])
+                block[:, 2] = np.asarray(chunk.Z)[keep] * sz + (oz - centroid[2])
+                write_ptr += m
+        loose_points = loose_points[:write_ptr]
+
+        # 较高阈值在较低阈值的结果子集上再筛选
+        strict_mask = loose_points[:, 2] > (base_height + 3.0)  # 提高过滤阈值
+        n_strict = int(np.count_nonzero(strict_mask))
+        log(f"✅ 高度过滤完成，保留点数: {n_strict}")
+
+        if n_strict < 1000:
             log("⚠️ 过滤后点数太少，尝试降低过滤阈值")
-            filtered_points = points[z_values > (base_height + 1.0)]
+            filtered_points = loose_points
+        else:
+            filtered_points = loose_points[strict_mask]
+        del loose_points, strict_mask
 
     except Exception as e:
         log(f"⚠️ 高度过滤失败: {str(e)}")
         return tower_obbs
 
-    # ==================== 改进的聚类处理 ====================
-    chunk_size = 50000  # 增大分块尺寸
-    chunks = [filtered_points[i:i + chunk_size] for i in range(0, len(filtered_points), chunk_size)]
+    # ==================== 全局聚类处理 ====================
+    # 整体聚类一次，避免分块边界把同一杆塔切成多个簇
     all_labels = np.full(len(filtered_points), -1, dtype=np.int32)
-    current_label = 0
 
     log("\n=== 开始聚类处理 ===")
     progress(20)
 
-    for i, chunk in enumerate(chunks):
-        try:
-            log(f"处理分块 {i + 1}/{len(chunks)} ({len(chunk)}点)")
-            clustering = DBSCAN(
-                eps=eps,
-                min_samples=min_points,
-                n_jobs=-1,
-                algorithm='ball_tree'  # 使用更高效的算法
-            ).fit(chunk)
-            chunk_labels = clustering.labels_
-            chunk_labels[chunk_labels != -1] += current_label
-            all_labels[i * chunk_size:(i + 1) * chunk_size] = chunk_labels
-            current_label = np.max(chunk_labels) + 1 if np.any(chunk_labels != -1) else current_label
-            progress(20 + int(50 * (i + 1) / len(chunks)))
-        except Exception as e:
-            log(f"⚠️ 分块聚类失败（块{i}）: {str(e)}")
-        finally:
-            del chunk, clustering, chunk_labels
-            gc.collect()
+    try:
+        # 体素下采样：每个体素用质心代表，点数作为权重，min_points 含义保持不变
+        voxel_keys = np.floor(filtered_points / voxel_size).astype(np.int64)
+        _, voxel_index, voxel_counts = np.unique(
+            voxel_keys, axis=0, return_inverse=True, return_counts=True
+        )
+        voxel_index = voxel_index.ravel()
+        del voxel_keys
+        voxel_points = np.column_stack([
+            np.bincount(voxel_index, weights=filtered_points[:, k], minlength=len(voxel_counts))
+            for k in range(3)
+        ]) / voxel_counts[:, None]
+        log(f"体素下采样完成: {len(filtered_points)} → {len(voxel_points)} 点")
+        progress(30)
+
+        voxel_labels = DBSCAN(
+            eps=eps,
+            min_samples=min_points,
+            n_jobs=-1,
+            algorithm='kd_tree',
+            leaf_size=40
+        ).fit_predict(voxel_points, sample_weight=voxel_counts)
+
+        # 体素标签直接回传给体素内的所有原始点
+        all_labels = voxel_labels[voxel_index].astype(np.int32)
+        del voxel_points, voxel_labels, voxel_index, voxel_counts
+        gc.collect()
+    except Exception as e:
+        log(f"⚠️ 聚类失败: {str(e)}")
+
+    progress(70)
 
     # ==================== 杆塔检测与去重 ====================
-    unique_labels = set(all_labels) - {-1}
+    # 按标签排序一次，每个簇对应排序后的一段连续区间，避免逐簇全量比较
+    order = np.argsort(all_labels, kind='stable')
+    uniq, starts = np.unique(all_labels[order], return_index=True)
+    ends = np.append(starts[1:], len(order))
     tower_centers = []
+    center_tree = None  # 已接受杆塔中心的KD树，数量翻倍时重建
+    tree_size = 0
 
-    log(f"\n=== 开始杆塔检测（候选簇：{len(unique_labels)}个） ===")
+    labels = [(u, s, e) for u, s, e in zip(uniq.tolist(), starts, ends) if u != -1]
+
+    log(f"\n=== 开始杆塔检测（候选簇：{len(labels)}个） ===")
     progress(75)
 
-    for label_idx, label in enumerate(unique_labels):
-        try:
-            cluster_mask = (all_labels == label)
-            cluster_points = filtered_points[cluster_mask]
+    las_header = _make_las_header(header_info)
 
-            # 计算OBB
-            cluster_pc = trimesh.PointCloud(cluster_points)
-            obb = cluster_pc.bounding_box_oriented
-            extents = obb.extents
+    # 轴对齐包围盒粗筛：OBB的任一边长都不超过AABB的三维对角线，
+    # 对角线不大于最小高度或最小宽度的簇必然被OBB尺寸过滤剔除，因此粗筛不会误删合格簇（倾斜簇同样成立）
+    candidates = []
+    for label, start, end in labels:
+        cluster_points = filtered_points[order[start:end]]
+        dx, dy, dz = cluster_points.max(axis=0) - cluster_points.min(axis=0)
+        diagonal = math.hypot(dx, dy, dz)
+        if diagonal <= min_height or diagonal <= min_width:
+            continue
+        candidates.append((label, cluster_points))
+    log(f"粗筛后剩余候选簇：{len(candidates)}个")
+
+    # 各候选簇的OBB及北方向偏角计算相互独立；候选簇较多时多线程并行（编译内核释放GIL，
+    # 点数组无需序列化到子进程），较少时直接串行。去重和保存在主线程按标签顺序进行
+    if len(candidates) >= PARALLEL_MIN_CANDIDATES and n_jobs != 1:
+        analyses = Parallel(n_jobs=n_jobs, backend='threading')(
+            delayed(_analyze_candidate)(cluster_points, use_trimesh_obb)
+            for _, cluster_points in candidates
+        )
+    else:
+        analyses = [_analyze_candidate(cluster_points, use_trimesh_obb) for _, cluster_points in candidates]
+
+    for label_idx, ((label, cluster_points), analysis) in enumerate(zip(candidates, analyses)):
+        try:
+            if isinstance(analysis, str):
+                raise RuntimeError(analysis)
+            obb_center, rotation_matrix, extents, north_angle = analysis
 
             # 尺寸过滤条件 - 使用towers.py的逻辑
             height = extents[2]
@@ -148,38 +233,28 @@ def extract_towers(
 
 
             # 计算正确全局坐标
-            obb_center = obb.transform[:3, 3] + centroid
+            obb_center = obb_center + centroid
 
-            # 去重检查 - 使用towers.py的逻辑
-            is_duplicate = False
-            for existing in tower_centers:
-                distance = np.linalg.norm(obb_center - existing)
+            # 去重检查：先查KD树，再线性检查尚未入树的少量中心
+            duplicate_distance = None
+            if center_tree is not None:
+                distance, _ = center_tree.query(obb_center)
                 if distance < duplicate_threshold:
-                    is_duplicate = True
-                    log(f"⚠️ 跳过重复杆塔{label} (中心距: {distance:.1f}m)")
-                    break
-            if is_duplicate:
+                    duplicate_distance = distance
+            if duplicate_distance is None:
+                for existing in tower_centers[tree_size:]:
+                    distance = np.linalg.norm(obb_center - existing)
+                    if distance < duplicate_threshold:
+                        duplicate_distance = distance
+                        break
+            if duplicate_distance is not None:
+                log(f"⚠️ 跳过重复杆塔{label} (中心距: {duplicate_distance:.1f}m)")
                 continue
 
-            # 计算北方向偏角
-            rotation_matrix = obb.transform[:3, :3]
-            x_axis = rotation_matrix[:, 0]
-            horizontal_direction = np.array([x_axis[0], x_axis[1], 0])
-            if np.linalg.norm(horizontal_direction) > 1e-6:
-                horizontal_direction /= np.linalg.norm(horizontal_direction)
-            else:
-                horizontal_direction = np.array([1, 0, 0])
-
-            angle_rad = np.arctan2(horizontal_direction[1], horizontal_direction[0])
-            north_angle = np.degrees(angle_rad)
-            if north_angle < 0:
-                north_angle += 360
-            north_angle = (90 - north_angle) % 360
-
             # 保存杆塔信息
             tower_info = {
                 "center": obb_center,
-                "rotation": obb.transform[:3, :3],
+                "rotation": rotation_matrix,
                 "extent": extents,
                 "height": height,
                 "width": width,
@@ -188,6 +263,9 @@ def extract_towers(
             }
             tower_obbs.append(tower_info)
             tower_centers.append(obb_center)
+            if len(tower_centers) >= 2 * tree_size:
+                center_tree = cKDTree(np.array(tower_centers))
+                tree_size = len(tower_centers)
 
             # 保存到信息列表
             tower_info_list.append({
@@ -204,25 +282,29 @@ def extract_towers(
             # 保存点云
             original_points = cluster_points + centroid
             output_path = output_dir / f"tower_{label}.las"
-            _save_tower_las(original_points, None, header_info, output_path, log)
+            _save_tower_las(original_points, None, las_header, output_path, log)
 
             log(f"✅ 杆塔{label}: {height:.1f}m高 | {width:.1f}m宽 | 中心坐标{obb_center}")
 
-            progress(75 + int(15 * (label_idx + 1) / len(unique_labels)))
+            progress(75 + int(15 * (label_idx + 1) / len(candidates)))
 
         except Exception as e:
             log(f"⚠️ 簇{label} 处理失败: {str(e)}")
             continue
-        finally:
-            del cluster_points, cluster_pc, obb
-            gc.collect()
+
+    del candidates, analyses, order
+    gc.collect()
 
     # ==================== 保存杆塔信息到Excel ====================
     if tower_info_list:
         try:
             output_excel_path = "towers_info.xlsx"
-            df = pd.DataFrame(tower_info_list)
-            df.to_excel(output_excel_path, index=False)
+            wb = Workbook(write_only=True)
+            ws = wb.create_sheet("Sheet1")
+            ws.append(list(tower_info_list[0].keys()))
+            for t in tower_info_list:
+                ws.append(list(t.values()))
+            wb.save(output_excel_path)
             log(f"\n✅ 杆塔信息已保存到: {output_excel_path}")
             log(f"检测到杆塔数量: {len(tower_obbs)}个")
         except Exception as e:
@@ -232,7 +314,7 @@ def extract_towers(
 
     # ==================== 内存清理 ====================
     log("\n=== 清理内存 ===")
-    del points, filtered_points
+    del filtered_points
     gc.collect()
 
     progress(100)
@@ -240,20 +322,153 @@ def extract_towers(
     return tower_obbs
 
 
-def _save_tower_las(points, colors, header_info, output_path, log_callback=None):
-    """优化的LAS保存函数 - 参照towers.py"""
-    try:
-        header = laspy.LasHeader(
-            point_format=header_info["point_format"],
-            version=header_info["version"]
-        )
-        header.scales = header_info["scales"]
-        header.offsets = header_info["offsets"]
+def _compute_obb(points):
+    """
+    基于PCA计算点云的有向包围盒，代替trimesh的bounding_box_oriented
+
+    返回:
+        (transform, extents): 4x4变换矩阵（与trimesh布局一致）和三个轴向尺寸，
+        第三个轴取与竖直方向最接近的主轴，对应杆塔高度
+    """
+    c = points.mean(axis=0)
+    X = points - c
+    cov = (X.T @ X) / len(X)
+    _, R = np.linalg.eigh(cov)  # 特征值升序
+
+    # 与Z轴夹角最小的主轴作为竖直轴，其余两轴按方差从大到小排列
+    vertical = int(np.argmax(np.abs(R[2, :])))
+    horizontal = [k for k in (2, 1, 0) if k != vertical]
+    R = R[:, horizontal + [vertical]]
+    if R[2, 2] < 0:
+        R[:, 2] = -R[:, 2]
+    if np.linalg.det(R) < 0:
+        R[:, 1] = -R[:, 1]
+
+    proj = X @ R
+    mins, maxs = proj.min(axis=0), proj.max(axis=0)
+    extents = maxs - mins
+
+    transform = np.eye(4)
+    transform[:3, :3] = R
+    transform[:3, 3] = c + R @ ((mins + maxs) / 2)
+    return transform, extents
 
+
+def _north_angle(rotation_matrix):
+    """由OBB第一主轴的水平投影计算北方向偏角（度）"""
+    return (90.0 - math.degrees(math.atan2(rotation_matrix[1, 0], rotation_matrix[0, 0]))) % 360.0
+
+
+def _analyze_cluster_numpy(cluster_points):
+    """返回 (中心, 旋转矩阵, 尺寸, 北方向偏角)，中心为去质心后的局部坐标"""
+    transform, extents = _compute_obb(cluster_points)
+    return transform[:3, 3], transform[:3, :3], extents, _north_angle(transform[:3, :3])
+
+
+def _analyze_candidate(cluster_points, use_trimesh_obb=False):
+    """并行任务：分析单个候选簇，失败时返回错误信息而不中断其他簇"""
+    try:
+        if use_trimesh_obb:
+            return _analyze_cluster_trimesh(cluster_points)
+        return _analyze_cluster(cluster_points)
+    except Exception as e:
+        return str(e)
+
+
+def _analyze_cluster_trimesh(cluster_points):
+    """trimesh版本的簇分析，用于与PCA结果对照"""
+    import trimesh
+    obb = trimesh.PointCloud(cluster_points).bounding_box_oriented
+    return obb.transform[:3, 3], obb.transform[:3, :3], obb.extents, _north_angle(obb.transform[:3, :3])
+
+
+if HAS_NUMBA:
+    @njit(cache=True, fastmath=True, nogil=True)
+    def _analyze_cluster_jit(cluster_points):
+        """与 _analyze_cluster_numpy 相同的计算，编译为本地代码"""
+        n = cluster_points.shape[0]
+        c = np.zeros(3)
+        for i in range(n):
+            for k in range(3):
+                c[k] += cluster_points[i, k]
+        c /= n
+
+        cov = np.zeros((3, 3))
+        for i in range(n):
+            for a in range(3):
+                da = cluster_points[i, a] - c[a]
+                for b in range(3):
+                    cov[a, b] += da * (cluster_points[i, b] - c[b])
+        cov /= n
+        _, R = np.linalg.eigh(cov)
+
+        # 与Z轴夹角最小的主轴作为竖直轴，其余两轴按方差从大到小排列
+        vertical = 0
+        for k in range(1, 3):
+            if abs(R[2, k]) > abs(R[2, vertical]):
+                vertical = k
+        Rs = np.empty((3, 3))
+        j = 0
+        for k in range(2, -1, -1):
+            if k != vertical:
+                Rs[:, j] = R[:, k]
+                j += 1
+        Rs[:, 2] = R[:, vertical]
+        if Rs[2, 2] < 0:
+            Rs[:, 2] = -Rs[:, 2]
+        det = (Rs[0, 0] * (Rs[1, 1] * Rs[2, 2] - Rs[1, 2] * Rs[2, 1])
+               - Rs[0, 1] * (Rs[1, 0] * Rs[2, 2] - Rs[1, 2] * Rs[2, 0])
+               + Rs[0, 2] * (Rs[1, 0] * Rs[2, 1] - Rs[1, 1] * Rs[2, 0]))
+        if det < 0:
+            Rs[:, 1] = -Rs[:, 1]
+
+        mins = np.empty(3)
+        maxs = np.empty(3)
+        for i in range(n):
+            for k in range(3):
+                p = ((cluster_points[i, 0] - c[0]) * Rs[0, k]
+                     + (cluster_points[i, 1] - c[1]) * Rs[1, k]
+                     + (cluster_points[i, 2] - c[2]) * Rs[2, k])
+                if i == 0 or p < mins[k]:
+                    mins[k] = p
+                if i == 0 or p > maxs[k]:
+                    maxs[k] = p
+        extents = maxs - mins
+        mid = (mins + maxs) / 2
+        center = np.empty(3)
+        for a in range(3):
+            center[a] = c[a] + Rs[a, 0] * mid[0] + Rs[a, 1] * mid[1] + Rs[a, 2] * mid[2]
+
+        north_angle = (90.0 - math.degrees(math.atan2(Rs[1, 0], Rs[0, 0]))) % 360.0
+        return center, Rs, extents, north_angle
+
+    _analyze_cluster = _analyze_cluster_jit
+else:
+    _analyze_cluster = _analyze_cluster_numpy
+
+
+def _make_las_header(header_info):
+    """按原始点云的格式、版本、比例和偏移构造LAS头，供所有杆塔文件复用"""
+    header = laspy.LasHeader(
+        point_format=header_info["point_format"],
+        version=header_info["version"]
+    )
+    header.scales = header_info["scales"]
+    header.offsets = header_info["offsets"]
+    return header
+
+
+def _save_tower_las(points, colors, header, output_path, log_callback=None):
+    """优化的LAS保存函数 - 参照towers.py
+
+    header 为 _make_las_header 构造的模板，写入时点数和范围会按本次数据重新计算，
+    因此可在顺序写入的多个文件间复用
+    """
+    try:
         las = laspy.LasData(header)
-        las.x = points[:, 0].astype(np.float64)
-        las.y = points[:, 1].astype(np.float64)
-        las.z = points[:, 2].astype(np.float64)
+        las.x = np.ascontiguousarray(points[:, 0], dtype=np.float64)
+        las.y = np.ascontiguousarray(points[:, 1], dtype=np.float64)
+        las.z = np.ascontiguousarray(points[:, 2], dtype=np.float64)
         las.write(output_path)
         if log_callback:
             log_callback(f"保存成功：{output_path}")